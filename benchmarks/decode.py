@@ -0,0 +1,217 @@
+""" Decoder throughput and memory per stage on a synthetic corpus
+
+    python -m benchmarks.decode [--sizes 0.1 1] [--save results.json]
+                                [--compare benchmarks/baseline.json]
+
+Corpus covers sampling modes, baseline, progressive and restart
+intervals, it's generated by the encoder once and kept in corpus
+directory. Stages are markers parsing, entropy decoding, finishing
+(dequantization and IDCT), linearization and BMP writing. Time is the
+best of several runs, memory is the peak of Python allocations of each
+stage, traced in a separate run.
+
+benchmarks/baseline.json is the stored baseline of the default cases.
+Times depend on the machine, so before comparing a change, regenerate it
+on the same machine from the commit the change is based on:
+
+    python -m benchmarks.decode --save benchmarks/baseline.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tracemalloc
+from io import BytesIO
+
+from bmp.core import write_bmp
+from jpeg import JpegImage, write_jpeg
+from jpeg.transcode import to_progressive
+from .utils import make_pixels
+
+
+samplings = {
+    '444': ((1, 1), (1, 1), (1, 1)),
+    '422': ((2, 1), (1, 1), (1, 1)),
+    '420': ((2, 2), (1, 1), (1, 1)),
+    '440': ((1, 2), (1, 1), (1, 1)),
+    'gray': None,
+}
+
+modes = ('baseline', 'progressive', 'restart')
+
+stages = ('markers', 'entropy', 'finish', 'linearize', 'bmp')
+
+
+def get_image_size(megapixels):
+    """ 4:3 image of about given megapixels """
+    w = int(math.sqrt(megapixels * 1e6 * 4 / 3))
+    return w, int(w * 3 / 4)
+
+def get_case_name(megapixels, sampling, mode):
+    return '{}mp-{}-{}'.format(megapixels, sampling, mode)
+
+def make_case(megapixels, sampling, mode):
+    w, h = get_image_size(megapixels)
+    fmt = 'L' if sampling == 'gray' else 'YCbCr'
+    n = 1 if fmt == 'L' else 3
+    pixels = make_pixels(w, h, n)
+    restart_interval = None
+    if mode == 'restart':
+        restart_interval = max(1, w // 64)
+    output = BytesIO()
+    write_jpeg(output, fmt, w, h, pixels, sampling=samplings[sampling],
+               restart_interval=restart_interval)
+    if mode == 'progressive':
+        output.seek(0)
+        progressive = BytesIO()
+        to_progressive(output, progressive)
+        output = progressive
+    return output.getvalue()
+
+def load_case(corpus, name, megapixels, sampling, mode):
+    path = os.path.join(corpus, name + '.jpg')
+    if not os.path.exists(path):
+        data = make_case(megapixels, sampling, mode)
+        os.makedirs(corpus, exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+    with open(path, 'rb') as f:
+        return f.read()
+
+def run_stages(data, measure):
+    """ Decode image stage by stage, measure(stage, fn) runs each one """
+    img = JpegImage(BytesIO(data))
+    measure('markers', img.parse)
+    measure('entropy', img.decode_coefficients)
+
+    def finish():
+        for comp in img.frame.components:
+            img.finish_component(comp)
+    measure('finish', finish)
+
+    pixels = []
+    measure('linearize', lambda: pixels.append(img.get_linearized_data()))
+    frame = img.frame
+    measure('bmp', lambda: write_bmp(BytesIO(), img.get_format(), frame.w, frame.h, pixels[0]))
+
+def measure_times(data, repeat):
+    best = {}
+
+    def measure(stage, fn):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best[stage] = min(best.get(stage, elapsed), elapsed)
+
+    for _ in range(repeat):
+        run_stages(data, measure)
+    return best
+
+def reset_peak():
+    """ tracemalloc.reset_peak is new in Python 3.9, before it traces are
+    cleared, so the peak counts only allocations of the stage
+    """
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.clear_traces()
+
+def measure_memory(data):
+    peaks = {}
+
+    def measure(stage, fn):
+        reset_peak()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        peaks[stage] = peak
+
+    tracemalloc.start()
+    try:
+        run_stages(data, measure)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+def run_case(data, megapixels, repeat):
+    times = measure_times(data, repeat)
+    peaks = measure_memory(data)
+    total = sum(times.values())
+    return {
+        'megapixels': megapixels,
+        'mps': megapixels / total,
+        'stages': {stage: {
+            'seconds': times[stage],
+            'mps': megapixels / times[stage] if times[stage] else None,
+            'peak_kb': peaks[stage] // 1024,
+        } for stage in stages},
+    }
+
+def compare(results, baseline, threshold):
+    """ Prints relative change of MP/s against baseline, returns number of
+    regressions beyond threshold
+    """
+    regressions = 0
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        parts = []
+        for stage in stages + ('total',):
+            if stage == 'total':
+                old, new = base['mps'], result['mps']
+            else:
+                old = base['stages'][stage]['mps']
+                new = result['stages'][stage]['mps']
+            if not old or not new:
+                continue
+            change = new / old - 1
+            mark = ''
+            if change < -threshold:
+                mark = '!'
+                regressions += 1
+            parts.append('{} {:+.0%}{}'.format(stage, change, mark))
+        print('{:28} {}'.format(name, ', '.join(parts)))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.decode')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[0.1],
+                        help='megapixels, e.g. 0.1 1 6 24')
+    parser.add_argument('--sampling', nargs='+', choices=sorted(samplings),
+                        default=sorted(samplings))
+    parser.add_argument('--modes', nargs='+', choices=modes, default=list(modes))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--corpus', default='.bench-corpus')
+    parser.add_argument('--save', help='write results as JSON')
+    parser.add_argument('--compare', help='baseline JSON to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown reported as regression')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for megapixels in args.sizes:
+        for sampling in args.sampling:
+            for mode in args.modes:
+                name = get_case_name(megapixels, sampling, mode)
+                data = load_case(args.corpus, name, megapixels, sampling, mode)
+                result = results[name] = run_case(data, megapixels, args.repeat)
+                print('{:28} {:.3f} MP/s, {}'.format(name, result['mps'], ', '.join(
+                    '{} {:.3f}s {}KB'.format(stage, info['seconds'], info['peak_kb'])
+                    for stage, info in result['stages'].items())))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+""" Encoder throughput in megapixels per second
+
+    python -m benchmarks.encode [width height]
+"""
+import sys
+from io import BytesIO
+
+from jpeg import write_jpeg
+from .utils import make_pixels, timed, mps
+
+
+cases = [
+    ('L', None),
+    ('YCbCr', ((1, 1), (1, 1), (1, 1))),
+    ('YCbCr', ((2, 1), (1, 1), (1, 1))),
+    ('YCbCr', ((2, 2), (1, 1), (1, 1))),
+]
+
+def main(w, h):
+    for fmt, sampling in cases:
+        n = 1 if fmt == 'L' else 3
+        pixels = make_pixels(w, h, n)
+        out = BytesIO()
+        seconds = timed(write_jpeg, out, fmt, w, h, pixels, sampling=sampling)
+        name = fmt if sampling is None else '{} {}'.format(fmt, sampling[0])
+        print('{:20} {}x{}: {:.3f} MP/s'.format(name, w, h, mps(w, h, seconds)))
+        seconds = timed(write_jpeg, out, fmt, w, h, pixels, sampling=sampling,
+                        optimize=True)
+        print('{:20} {}x{}: {:.3f} MP/s'.format(name + ' optimize', w, h,
+                                                mps(w, h, seconds)))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        main(int(sys.argv[1]), int(sys.argv[2]))
+    else:
+        main(256, 256)
@@ -0,0 +1,206 @@
+""" Microbenchmarks of decoder hot kernels, operations per second with
+spread over runs
+
+    python -m benchmarks.kernels [kernel ...]
+
+Inputs are generated with fixed seed, so numbers are comparable between
+runs and commits.
+"""
+import sys
+import math
+import random
+import statistics
+import time
+from io import BytesIO
+from array import array
+
+from jpeg import JpegImage, write_jpeg
+from jpeg.idct import idct_2d
+from jpeg.zigzag import dezigzag
+from jpeg.tables import luminance_ac, get_huffman_codes
+from jpeg.huffman.decoding import BitDecoder
+from jpeg.transcode import to_progressive
+from jpeg.scan_decode import (BitReader, receive_and_extend, make_block_decoder,
+                              iter_decode_mcus, get_scan_blocks, set_block)
+from .utils import make_pixels
+
+
+SEED = 1234
+RUNS = 7
+
+# each measured run repeats the kernel for at least this time
+MIN_RUN_TIME = 0.1
+
+
+def make_bytes(n, seed=SEED):
+    """ Random bytes without 0xFF, so there is no byte stuffing """
+    rnd = random.Random(seed)
+    return bytes(rnd.randrange(0xFF) for _ in range(n))
+
+def make_block(nonzero, seed=SEED):
+    rnd = random.Random(seed)
+    block = array('h', bytes(128))
+    block[0] = rnd.randrange(-512, 512)
+    for i in range(1, nonzero):
+        block[dezigzag[i]] = rnd.randrange(-64, 64)
+    return block
+
+def get_code_bits(codes, symbols):
+    bits = []
+    for ch in symbols:
+        bits.extend(codes[ch])
+    return bits
+
+def make_image(progressive=False):
+    """ Parsed 128x128 grayscale image and entropy-coded data of its scans """
+    w, h = 128, 128
+    output = BytesIO()
+    write_jpeg(output, 'L', w, h, make_pixels(w, h, 1))
+    if progressive:
+        output.seek(0)
+        baseline, output = output, BytesIO()
+        to_progressive(baseline, output)
+    output.seek(0)
+    img = JpegImage(output)
+    img.parse()
+    img.frame.prepare()
+    data = output.getvalue()
+    scans = [(scan, data[scan.position:scan.position + img.get_scan_length(scan)])
+             for scan in img.scans]
+    return img, scans
+
+
+def bench_bit_reader_next():
+    data = make_bytes(4096)
+
+    def run():
+        reader = BitReader(BytesIO(data))
+        for _ in reader:
+            pass
+    return run, len(data) * 8
+
+def bench_bit_reader_read_byte():
+    data = make_bytes(4096)
+
+    def run():
+        reader = BitReader(BytesIO(data))
+        read_byte = reader.read_byte
+        for _ in range(len(data) - 1):
+            read_byte()
+    return run, len(data) - 1
+
+def bench_bit_decoder():
+    codes = get_huffman_codes(luminance_ac)
+    rnd = random.Random(SEED)
+    symbols = [rnd.choice(luminance_ac[1]) for _ in range(2000)]
+    bits = get_code_bits(codes, symbols)
+
+    def run():
+        decoder = BitDecoder(codes)
+        for bit in bits:
+            decoder(bit)
+    return run, len(symbols)
+
+def bench_receive_and_extend():
+    data = make_bytes(4096)
+    lengths = [1 + i % 11 for i in range(len(data) * 8 // 12)]
+
+    def run():
+        reader = BitReader(BytesIO(data))
+        for length in lengths:
+            receive_and_extend(reader, length)
+    return run, len(lengths)
+
+def bench_baseline_block():
+    img, ((scan, data),) = make_image()
+    comp = img.frame.components[0]
+    blocks = comp.blocks
+
+    def run():
+        decode_block, _ = make_block_decoder(BitReader(BytesIO(data)), scan, comp)
+        for block in blocks:
+            decode_block(block)
+    return run, len(blocks)
+
+def bench_progressive_scans():
+    img, scans = make_image(progressive=True)
+
+    def run():
+        for comp in img.frame.components:
+            for block in comp.blocks:
+                block[:] = array('h', bytes(128))
+        for scan, data in scans:
+            for _ in iter_decode_mcus(BitReader(BytesIO(data)), scan):
+                pass
+    return run, sum(get_scan_blocks(scan) for scan, _ in scans)
+
+def bench_idct(nonzero):
+    block = make_block(nonzero)
+    n = 500
+
+    def run():
+        for _ in range(n):
+            idct_2d(array('h', block))
+    return run, n
+
+def bench_set_block():
+    block = make_block(64)
+    width = 256
+    data = array('h', bytes(width * 8 * 2))
+    n = 2000
+
+    def run():
+        for i in range(n):
+            set_block(data, block, 0, (i % 32) * 8, width)
+    return run, n
+
+def bench_dezigzag():
+    coefficients = list(make_block(64))
+    n = 2000
+
+    def run():
+        block = array('h', bytes(128))
+        for _ in range(n):
+            for k, value in enumerate(coefficients):
+                block[dezigzag[k]] = value
+    return run, n
+
+kernels = {
+    'bit_reader_next': bench_bit_reader_next,
+    'bit_reader_read_byte': bench_bit_reader_read_byte,
+    'bit_decoder': bench_bit_decoder,
+    'receive_and_extend': bench_receive_and_extend,
+    'baseline_block': bench_baseline_block,
+    'progressive_scans': bench_progressive_scans,
+    'idct_2d_sparse': lambda: bench_idct(1),
+    'idct_2d_dense': lambda: bench_idct(64),
+    'set_block': bench_set_block,
+    'dezigzag': bench_dezigzag,
+}
+
+
+def measure(run, ops, runs=RUNS):
+    """ Mean ops/sec and relative standard deviation over runs, after a
+    warm-up run, which calibrates number of loops of a run
+    """
+    start = time.perf_counter()
+    run()
+    loops = max(1, math.ceil(MIN_RUN_TIME / (time.perf_counter() - start)))
+    rates = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        rates.append(ops * loops / (time.perf_counter() - start))
+    mean = statistics.mean(rates)
+    return mean, statistics.stdev(rates) / mean
+
+def main(names):
+    for name in names or kernels:
+        run, ops = kernels[name]()
+        rate, noise = measure(run, ops)
+        print('{:22} {:12,.0f} ops/s  +-{:.1%}'.format(name, rate, noise))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
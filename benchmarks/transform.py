@@ -0,0 +1,37 @@
+""" Lossless transformations and transcoding compared to decode and encode
+of pixels
+
+    python -m benchmarks.transform [image.jpg]
+"""
+import sys
+from io import BytesIO
+
+from jpeg import JpegImage, write_jpeg
+from jpeg.transform import transform
+from jpeg.transcode import optimize, requantize
+from .utils import timed
+
+
+def decode_encode(data):
+    img = JpegImage(BytesIO(data))
+    img.process()
+    frame = img.frame
+    pixels = img.get_linearized_data()
+    write_jpeg(BytesIO(), img.get_format(), frame.w, frame.h, pixels)
+
+def main(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    reference = timed(decode_encode, data)
+    print('decode + encode: {:.3f} s'.format(reference))
+    for op in ('flip_h', 'rot90', 'rot180'):
+        seconds = timed(lambda: transform(BytesIO(data), BytesIO(), op))
+        print('{:15} {:.3f} s, {:.1f}x'.format(op + ':', seconds, reference / seconds))
+    seconds = timed(lambda: optimize(BytesIO(data), BytesIO()))
+    print('{:15} {:.3f} s, {:.1f}x'.format('optimize:', seconds, reference / seconds))
+    seconds = timed(lambda: requantize(BytesIO(data), BytesIO(), quality=50))
+    print('{:15} {:.3f} s, {:.1f}x'.format('requantize:', seconds, reference / seconds))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else 'jpeg/test/functional/data/divine-flux.jpg')
@@ -0,0 +1,30 @@
+import time
+from array import array
+
+
+def make_pixels(w, h, n):
+    """ Synthetic image with smooth gradients and some texture,
+    interleaved bytes of n components
+    """
+    pixels = array('B', bytes(w * h * n))
+    for y in range(h):
+        for x in range(w):
+            coord = (y * w + x) * n
+            texture = ((x * 7) ^ (y * 13)) & 31
+            for c in range(n):
+                value = (x * (c + 1) + y * (3 - c)) * 255 // (w + h) + texture
+                pixels[coord + c] = min(value, 255)
+    return pixels
+
+def timed(fn, *args, repeat=3, **kwargs):
+    """ Best wall time of several runs """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def mps(w, h, seconds):
+    return w * h / 1e6 / seconds
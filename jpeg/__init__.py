@@ -1 +1,2 @@
 from .core import JpegImage
+from .encoder import write_jpeg
@@ -0,0 +1,89 @@
+""" Decoding for asyncio: input is read from asyncio.StreamReader, CPU work
+runs in executor, so event loop is not blocked.
+"""
+import time
+import asyncio
+import threading
+import multiprocessing
+from io import BytesIO
+from functools import lru_cache, partial
+from concurrent.futures import ProcessPoolExecutor
+
+from .core import JpegImage
+from .limits import DecodeCancelled
+
+
+CHUNK_LEN = 64 * 1024
+
+# Seconds between polls of cancel event while decoding
+POLL_INTERVAL = 0.05
+
+
+@lru_cache(maxsize=None)
+def get_default_executor():
+    return ProcessPoolExecutor()
+
+@lru_cache(maxsize=None)
+def get_manager():
+    return multiprocessing.Manager()
+
+def make_cancel_event(executor):
+    """ Event which is visible to the worker running in executor """
+    if isinstance(executor, ProcessPoolExecutor):
+        return get_manager().Event()
+    return threading.Event()
+
+def make_check(cancel, interval=POLL_INTERVAL):
+    """ check hook raising DecodeCancelled once cancel event is set. Event
+    of manager is a round trip to its process, and check is called for
+    every block, so the event is polled at most once per interval
+    """
+    next_poll = 0.0
+
+    def check():
+        nonlocal next_poll
+        now = time.monotonic()
+        if now >= next_poll:
+            next_poll = now + interval
+            if cancel.is_set():
+                raise DecodeCancelled()
+    return check
+
+def decode_data(data, cancel=None, **opts):
+    """ Decode image from bytes, stops between scans, MCU rows or blocks
+    once cancel event is set. opts are passed to JpegImage: limits,
+    observer
+    """
+    img = JpegImage(BytesIO(data), **opts)
+    img.parse()
+    img.decode(make_check(cancel) if cancel is not None else None)
+    img.is_valid = True
+    img.fp = None
+    return img
+
+async def read_stream(reader, chunk_len=CHUNK_LEN):
+    chunks = []
+    while True:
+        chunk = await reader.read(chunk_len)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+async def decode_async(stream_reader, executor=None, chunk_len=CHUNK_LEN, **opts):
+    """ Decoded JpegImage read from stream_reader, decoding runs in
+    executor, process pool by default. Cancelling the task stops the
+    decoding in worker. opts are passed to JpegImage, they should be
+    picklable for process pool
+    """
+    data = await read_stream(stream_reader, chunk_len)
+    if executor is None:
+        executor = get_default_executor()
+    cancel = make_cancel_event(executor)
+
+    loop = asyncio.get_event_loop()
+    try:
+        return await loop.run_in_executor(executor, partial(decode_data, data, cancel, **opts))
+    except asyncio.CancelledError:
+        cancel.set()
+        raise
@@ -0,0 +1,124 @@
+""" Decoding of many images in a persistent process pool. Pixels are
+passed back from workers through shared memory, the number of images in
+flight is bounded. Shared memory needs Python 3.8, so the module is not
+imported by the package, use jpeg.batch.decode_many
+"""
+import os
+from io import BytesIO
+from collections import deque, namedtuple
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from .core import JpegImage, get_pool
+from .cache import DecodedImage
+
+
+BatchResult = namedtuple('BatchResult', 'index, image, error')
+
+
+def create_shared_memory(size):
+    """ Segment created in worker, it is not tracked there, as the parent
+    tracks and unlinks it
+    """
+    try:
+        return SharedMemory(create=True, size=size, track=False)
+    except TypeError:
+        shm = SharedMemory(create=True, size=size)
+        resource_tracker.unregister(shm._name, 'shared_memory') # pylint: disable=protected-access
+        return shm
+
+def get_error(e):
+    return '{}: {}'.format(type(e).__name__, getattr(e, 'msg', None) or e)
+
+def decode_item(item, limits=None):
+    """ Decode path or buffer in worker, returns description of pixels in
+    shared memory and error message
+    """
+    try:
+        if isinstance(item, (bytes, bytearray, memoryview)):
+            img = JpegImage(BytesIO(item), limits)
+            img.parse()
+            img.decode()
+        else:
+            with open(item, 'rb') as f:
+                img = JpegImage(f, limits)
+                img.parse()
+                img.decode()
+        data = img.get_linearized_data()
+    except Exception as e: # pylint: disable=broad-except
+        # corrupt entropy data fails in many ways, the error belongs to
+        # the item, not to the whole batch
+        return None, get_error(e)
+
+    size = len(data)
+    shm = create_shared_memory(size)
+    shm.buf[:size] = data
+    shm.close()
+    return (shm.name, img.get_format(), img.frame.w, img.frame.h, size), None
+
+def receive_image(info):
+    name, fmt, w, h, size = info
+    shm = SharedMemory(name=name)
+    try:
+        data = bytes(shm.buf[:size])
+    finally:
+        shm.close()
+        shm.unlink()
+    return DecodedImage(fmt, w, h, data)
+
+def release_image(future):
+    """ Unlink shared memory of result which is not received """
+    if future.cancelled() or future.exception() is not None:
+        return
+    info, _ = future.result()
+    if info:
+        shm = SharedMemory(name=info[0])
+        shm.close()
+        shm.unlink()
+
+def get_result(index, future):
+    info, error = future.result()
+    image = receive_image(info) if info else None
+    return BatchResult(index, image, error)
+
+def decode_many(items, workers=None, ordered=True, max_in_flight=None,
+                limits=None, executor=None):
+    """ Decode paths or buffers, yields BatchResult for each one, in input
+    order or as they complete. At most max_in_flight images are submitted
+    and not yet received
+    """
+    if executor is None:
+        executor = get_pool(workers)
+    if max_in_flight is None:
+        max_in_flight = 2 * (workers or os.cpu_count() or 1)
+
+    pending = deque()
+    try:
+        for index, item in enumerate(items):
+            if len(pending) >= max_in_flight:
+                if ordered:
+                    yield get_result(*pending.popleft())
+                else:
+                    yield from get_completed(pending)
+            pending.append((index, executor.submit(decode_item, item, limits)))
+
+        while pending:
+            if ordered:
+                yield get_result(*pending.popleft())
+            else:
+                yield from get_completed(pending)
+    finally:
+        # generator is closed early or failed, images already decoded or
+        # being decoded are released
+        running = [future for _, future in pending if not future.cancel()]
+        wait(running)
+        for future in running:
+            release_image(future)
+
+def get_completed(pending):
+    done, _ = wait([future for _, future in pending], return_when=FIRST_COMPLETED)
+    for index, future in list(pending):
+        if future in done:
+            pending.remove((index, future))
+            yield get_result(index, future)
@@ -0,0 +1,190 @@
+""" Cache of decoded images keyed by hash of file content and decode
+options. Recently used images are kept in memory, bounded by total size of
+pixel data. Optional disk tier stores raw pixels, which are memory mapped
+on hit, so pixel data is not copied. It is bounded by size and number of
+entries too, and could be shared by processes.
+"""
+import os
+import json
+import mmap
+import hashlib
+import tempfile
+from collections import OrderedDict, namedtuple
+
+from .core import JpegImage
+
+
+DecodedImage = namedtuple('DecodedImage', 'format, w, h, data')
+
+CHUNK_LEN = 1 << 16
+
+
+def get_content_hash(fp):
+    fp.seek(0)
+    h = hashlib.sha1()
+    for chunk in iter(lambda: fp.read(CHUNK_LEN), b''):
+        h.update(chunk)
+    fp.seek(0)
+    return h.hexdigest()
+
+def get_key(content_hash, region=None):
+    if region is None:
+        return content_hash
+    return '{}-{}'.format(content_hash, '_'.join(str(v) for v in region))
+
+def decode_image(fp, region=None):
+    img = JpegImage(fp)
+    img.parse()
+    fmt = img.get_format()
+    if region is not None:
+        _, _, w, h = region
+        return DecodedImage(fmt, w, h, img.decode_region(*region))
+    img.decode()
+    return DecodedImage(fmt, img.frame.w, img.frame.h, img.get_linearized_data())
+
+
+class DiskCache:
+    """ Raw pixels in <key>.raw and image description in <key>.json,
+    bounded by max_bytes of pixel data and max_entries. Modification time
+    of .raw file is the time of last use, least recently used entries are
+    evicted first
+    """
+
+    def __init__(self, path, max_bytes=1 << 30, max_entries=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        os.makedirs(path, exist_ok=True)
+
+    def get_path(self, key, ext):
+        return os.path.join(self.path, key + ext)
+
+    def get(self, key):
+        raw_path = self.get_path(key, '.raw')
+        try:
+            with open(self.get_path(key, '.json')) as f:
+                info = json.load(f)
+            with open(raw_path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            os.utime(raw_path)
+        except (OSError, ValueError):
+            return None
+        return DecodedImage(info['format'], info['w'], info['h'], memoryview(data))
+
+    def write(self, key, ext, data):
+        """ Write through unique temporary file, so concurrent writers of
+        the same key don't mix their data
+        """
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.path)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.get_path(key, ext))
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def put(self, key, image):
+        """ Store image, returns number of evicted entries """
+        info = {'format': image.format, 'w': image.w, 'h': image.h}
+        self.write(key, '.raw', image.data)
+        self.write(key, '.json', json.dumps(info).encode('utf-8'))
+        return self.evict()
+
+    def get_entries(self):
+        """ (last use time, size, key) of stored entries """
+        entries = []
+        for name in os.listdir(self.path):
+            key, ext = os.path.splitext(name)
+            if ext != '.raw':
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, key))
+        return entries
+
+    def remove(self, key):
+        for ext in ('.json', '.raw'):
+            try:
+                os.unlink(self.get_path(key, ext))
+            except OSError:
+                pass
+
+    def evict(self):
+        entries = sorted(self.get_entries())
+        size = sum(entry[1] for entry in entries)
+        evicted = 0
+        for _, entry_size, key in entries:
+            if size <= self.max_bytes and (self.max_entries is None or
+                                           len(entries) - evicted <= self.max_entries):
+                break
+            self.remove(key)
+            size -= entry_size
+            evicted += 1
+        return evicted
+
+
+class ImageCache:
+    """ LRU cache of decoded images, bounded by max_bytes of pixel data in
+    memory. Images evicted from memory stay in the disk tier, if cache_dir
+    is given, which is bounded by disk_max_bytes and disk_max_entries
+    """
+
+    def __init__(self, max_bytes=64 << 20, cache_dir=None, disk_max_bytes=1 << 30,
+                 disk_max_entries=None):
+        self.max_bytes = max_bytes
+        self.disk = None
+        if cache_dir is not None:
+            self.disk = DiskCache(cache_dir, disk_max_bytes, disk_max_entries)
+        self.images = OrderedDict()
+        self.size = 0
+        self.stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0,
+                      'disk_evictions': 0}
+
+    def get_stats(self):
+        return dict(self.stats, bytes=self.size, images=len(self.images))
+
+    def add(self, key, image):
+        size = len(image.data)
+        if size > self.max_bytes:
+            return
+        self.images[key] = image
+        self.size += size
+        while self.size > self.max_bytes:
+            _, evicted = self.images.popitem(last=False)
+            self.size -= len(evicted.data)
+            self.stats['evictions'] += 1
+
+    def get(self, fp, region=None):
+        """ Decoded image of file fp or of its region (x, y, w, h) """
+        key = get_key(get_content_hash(fp), region)
+
+        image = self.images.get(key)
+        if image is not None:
+            self.images.move_to_end(key)
+            self.stats['hits'] += 1
+            return image
+
+        image = self.disk.get(key) if self.disk else None
+        if image is not None:
+            self.stats['disk_hits'] += 1
+        else:
+            self.stats['misses'] += 1
+            image = decode_image(fp, region)
+            if self.disk:
+                self.stats['disk_evictions'] += self.disk.put(key, image)
+        self.add(key, image)
+        return image
+
+    def get_file(self, path, region=None):
+        with open(path, 'rb') as f:
+            return self.get(f, region)
+
+    def clear(self):
+        self.images.clear()
+        self.size = 0
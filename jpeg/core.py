@@ -1,12 +1,21 @@
 import struct
 import math
-from array import array
+import time
+import atexit
+from threading import Lock
 from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
 
-from . import sof_types, huffman
+from . import sof_types
 from .huffman.decoding import BitDecoder
-from .scan_decode import decode, decode_finish
-from .zigzag import dezigzag
+from .scan_decode import iter_decode, decode_component_finish, decode_pipelined, get_scan_blocks
+from .exif import get_exif_thumbnail
+from .index import build_restart_index
+from .region import Window, decode_region_indexed, decode_region_sequential
+from .table_cache import get_huffman_table, get_quantization_table, read_huffman_table
+from .limits import DecodeAborted
+from .stats import DecodeStats
+from .profiling import run_profiled, PROFILE_PATH
 from .utils import high_low4, make_array
 
 
@@ -35,6 +44,50 @@ class BadMarker(Exception):
         super().__init__()
         self.msg = 'unknown marker 0x{0:X}'.format(byte)
 
+DECODE_ERRORS = (EOFError, BadMarker, SyntaxError, DecodeAborted)
+
+def get_error_message(e):
+    """ Message of error event for one of DECODE_ERRORS """
+    if isinstance(e, EOFError):
+        return 'Unexpected End-of-file'
+    if isinstance(e, BadMarker):
+        return 'Invalid JPEG structure: ' + e.msg
+    if isinstance(e, SyntaxError):
+        return 'Invalid JPEG data: ' + e.msg
+    return 'Decoding aborted: ' + e.msg
+
+class SharedPool:
+    """ Process pool kept for the process lifetime, so workers are started
+    once, and their table caches stay warm between images. The pool is
+    replaced when another number of workers is requested
+    """
+
+    def __init__(self):
+        self.executor = None
+        self.workers = None
+        self.lock = Lock()
+
+    def get(self, workers=None):
+        with self.lock:
+            if self.executor is None or workers != self.workers:
+                if self.executor is not None:
+                    # work already submitted to old pool is finished
+                    self.executor.shutdown(wait=False)
+                self.executor = ProcessPoolExecutor(max_workers=workers)
+                self.workers = workers
+            return self.executor
+
+    def shutdown(self, wait=True):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+shared_pool = SharedPool()
+get_pool = shared_pool.get
+shutdown_pool = shared_pool.shutdown
+atexit.register(shutdown_pool)
+
 def safe_read(f, n):
     data = f.read(n)
     if not data or len(data) != n:
@@ -85,15 +138,16 @@ def parse_DHT(self, *args): # pylint: disable=unused-argument
         is_dc = tc == 0
         maxsymbol = 15 if is_dc else 255
 
-        codes = huffman.decode_table(data)
-        for code, _ in codes.items():
+        table = get_huffman_table(read_huffman_table(data))
+        for code, _ in table.codes.items():
             if code < 0 or code > maxsymbol:
                 raise SyntaxError('bad Huffman table')
 
+        self.decode_tables[(tc, th)] = table
         if is_dc:
-            self.huffman_dc[th] = codes
+            self.huffman_dc[th] = table.codes
         else:
-            self.huffman_ac[th] = codes
+            self.huffman_ac[th] = table.codes
 
 
 def parse_DQT(self, *args): # pylint: disable=unused-argument
@@ -105,10 +159,7 @@ def parse_DQT(self, *args): # pylint: disable=unused-argument
         qt, qc = high_low4(read_u8(data))
         if qt > 0:
             raise SyntaxError('only 8-bit quantization tables are supported')
-        dqt = array('B', data.read(64))
-        self.quantization[qc] = dequant = make_array('B', 64)
-        for i, z in enumerate(dezigzag):
-            dequant[z] = dqt[i]
+        self.quantization[qc] = get_quantization_table(data.read(64))
 
 def parse_DNL(self, *args): # pylint: disable=unused-argument
     data, length = read_block(self.fp)
@@ -128,12 +179,18 @@ def parse_APP(self, marker, *args): # pylint: disable=unused-argument
 
         if header == b'JFXX\x00':
             self.jfxx = True
+            extension_code = read_u8(data)
+            # thumbnail coded using JPEG
+            if extension_code == 0x10:
+                self.jfxx_thumbnail = data.read()
 
     if marker == 0xFFE1:
         header = data.read(5)
 
-        if header == b'Exif\x00':
+        if header == b'Exif\x00' and not self.exif:
             self.exif = True
+            data.read(1) # padding
+            self.exif_data = data.read()
 
     if marker == 0xFFEE:
         header = data.read(6)
@@ -163,6 +220,8 @@ def parse_SOF(self, marker, *args): # pylint: disable=unused-argument
     if length < 6 + 3 * cc:
         raise SyntaxError('bad SOF length')
 
+    # APP markers before SOF are parsed in marker order
+    self.header_apps_parsed = True
     frame = self.frame = Frame(marker, w, h)
     frame.restart_interval = self.restart_interval
     frame.quantization = self.quantization
@@ -172,6 +231,9 @@ def parse_SOF(self, marker, *args): # pylint: disable=unused-argument
         h, v = high_low4(q)
         frame.add_component(idx, h, v, tq)
 
+    if self.limits:
+        self.limits.check_frame(frame)
+
 class Scan:
     def __init__(self, frame):
         self.position = None
@@ -184,6 +246,7 @@ class Scan:
         self.approx_high = 0
         self.approx_low = 0
         self.prog_state = None
+        self.eob_runs = None # Counter of EOBRUN lengths, if stats are enabled
 
     @property
     def is_refine(self):
@@ -239,6 +302,8 @@ def parse_SOS(self, *args): # pylint: disable=unused-argument
 
     scan.position = self.fp.tell()
     self.scans.append(scan)
+    if self.limits:
+        self.limits.check_scans(len(self.scans))
 
 
 marker_map = {
@@ -314,23 +379,28 @@ class Component:
 
         self.size = (0, 0) # effective pixels, non-iterleaved MCU
         self.data = None
-        self.blocks_size = (0, 0)
+        self.blocks_size = (0, 0) # blocks padded to interleaved MCU
+        self.effective_blocks_size = (0, 0) # blocks of non-interleaved MCU
         self.blocks = None
 
         self.last_dc = 0
 
-    def prepare(self, frame):
+    def prepare(self, frame, allocate=True):
         h, v = self.sampling
         self.scale = (frame.max_h // h, frame.max_v // v)
 
         w2 = math.ceil(frame.w * h / frame.max_h)
         h2 = math.ceil(frame.h * v / frame.max_v)
         self.size = (w2, h2)
-        self.data = make_array('h', w2 * h2)
+        self.effective_blocks_size = (math.ceil(w2 / 8), math.ceil(h2 / 8))
 
-        width = math.ceil(w2 / 8)
-        height = math.ceil(h2 / 8)
+        mcu_x, mcu_y = frame.blocks_size
+        width = mcu_x * h
+        height = mcu_y * v
         self.blocks_size = (width, height)
+        if not allocate:
+            return
+        self.data = make_array('h', width * 8 * height * 8)
         self.blocks = [make_array('h', 64) for _ in range(width * height)]
 
 class Frame:
@@ -357,41 +427,66 @@ class Frame:
         self.max_v = max(v, self.max_v)
         return comp
 
-    def prepare(self):
+    def prepare(self, allocate=True):
+        """ Compute MCU and component geometry, and allocate blocks and
+        pixels data of components if allocate is set
+        """
         blocks_x = math.ceil(self.w / (8 * self.max_h))
         blocks_y = math.ceil(self.h / (8 * self.max_v))
         self.blocks_size = blocks_x, blocks_y
         for component in self.components:
-            component.prepare(self)
+            component.prepare(self, allocate)
 
 class JpegImage:
 
-    def __init__(self, fp):
+    def __init__(self, fp, limits=None, observer=None):
         self.fp = fp
         self.is_valid = None
+        self.limits = limits
+        self.observer = observer
 
         self.huffman_dc = {}
         self.huffman_ac = {}
+        self.decode_tables = {}
         self.quantization = {}
         self.restart_interval = None
         self.dnl_num_lines = None
 
         self.jfif = None
         self.jfxx = None
+        self.jfxx_thumbnail = None
+        self.exif = None
+        self.exif_data = None
+        self.header_apps_parsed = False # APP markers of header are parsed
         self.adobe = None
         self.adobe_color_transform = None
 
         self.frame = None
         self.scans = []
         self.marker_codes = []
+        self.restart_index = None
+
+        self.coefficients_decoded = False
+        self.finished_components = set()
+        self.stats = None
+        self.profile_report = None
+
+    @classmethod
+    def open(cls, fp):
+        """ Image with parsed headers, pixels are decoded on first access """
+        img = cls(fp)
+        img.parse()
+        return img
 
     def get_dc_decoder(self, dc_id):
         huffman_dc = self.huffman_dc.get(dc_id)
-        return BitDecoder(huffman_dc) if huffman_dc else None
+        table = self.decode_tables.get((0, dc_id))
+        return BitDecoder(huffman_dc, table) if huffman_dc else None
 
     def get_ac_decoder(self, ac_id):
         huffman_ac = self.huffman_ac.get(ac_id)
-        return BitDecoder(huffman_ac) if huffman_ac else None
+        table = self.decode_tables.get((1, ac_id))
+        return BitDecoder(huffman_ac, table) if huffman_ac else None
 
     @classmethod
     def is_jpeg(cls, fp):
@@ -434,6 +529,53 @@ class JpegImage:
             if marker == EOI:
                 break
 
+    def read_header_apps(self):
+        """ Parse APP markers of the header, stops at SOF. Position of fp
+        is kept
+        """
+        pos = self.fp.tell()
+        try:
+            self.fp.seek(0)
+            if get_marker_code(self.fp) != 0xFFD8:
+                raise SyntaxError('SOI is not the first market')
+            while True:
+                code = get_marker_code(self.fp)
+                marker = marker_map.get(code)
+                if marker in (SOF, SOS, EOI, None):
+                    break
+                if marker == APP:
+                    parse_APP(self, code)
+                else:
+                    read_block(self.fp)
+        finally:
+            self.fp.seek(pos)
+        self.header_apps_parsed = True
+
+    def get_embedded_thumbnail(self, decode=False):
+        """ Get thumbnail embedded to Exif or JFXX extension without
+        decoding the main image. Returns JPEG bytes of the thumbnail, or
+        decoded JpegImage if decode is set, or None if it is not found
+        """
+        # APP data is not kept in image index, so marker table could be
+        # known without it
+        if not self.header_apps_parsed:
+            try:
+                self.read_header_apps()
+            except (EOFError, SyntaxError):
+                return None
+
+        data = None
+        if self.exif_data:
+            data = get_exif_thumbnail(self.exif_data)
+        if not data and self.jfxx_thumbnail:
+            data = self.jfxx_thumbnail
+        if not data or not decode:
+            return data
+
+        thumbnail = JpegImage(BytesIO(data))
+        thumbnail.process()
+        return thumbnail
+
     def print_info(self):
         frame = self.frame
         scans = self.scans
@@ -448,7 +590,9 @@ class JpegImage:
 
         if frame.progressive:
             print('Progressive')
-            print('{} scans'.format(len(scans)))
+            # scans are not known yet, if image is decoded from stream
+            if scans:
+                print('{} scans'.format(len(scans)))
             for scan_i, scan in enumerate(scans):
                 scan_type = 'DC' if scan.is_dc else 'AC'
                 cids = [str(c.id) for c in scan.components]
@@ -538,41 +682,171 @@ class JpegImage:
             if not DNL_position == SOS_position + 1:
                 raise SyntaxError('DNL does not follow first SOS')
 
+    def enable_stats(self):
+        """ Count bits, Huffman symbols, EOB runs and blocks without AC
+        coefficients while decoding, see get_stats
+        """
+        self.stats = DecodeStats()
+
+    def get_stats(self):
+        return self.stats.to_dict() if self.stats else None
+
+    def emit(self, event, **info):
+        if self.observer:
+            self.observer(event, **info)
+
     def parse_marker_blocks(self):
         for code, marker, pos in self.marker_codes:
+            self.emit('marker', code=code, name=marker_names[marker], position=pos)
             parser = parsers.get(marker)
             if not parser:
                 continue
             self.fp.seek(pos)
             parser(self, code)
 
-    def decode(self):
+    def parse(self):
+        start = time.perf_counter()
+        self.emit('parse_start')
+        self.read_markers()
+        self.validate_markers()
+        self.parse_marker_blocks()
+        self.emit('parse_end', elapsed=time.perf_counter() - start)
+
+    def get_scan_length(self, scan):
+        """ Bytes of entropy-coded data of scan, with restart markers """
+        for _, marker, pos in self.marker_codes:
+            if pos > scan.position and marker != RST:
+                return pos - 2 - scan.position
+        return None
+
+    def decode_coefficients(self, check=None):
+        """ Entropy decoding of all scans, quantized coefficients are
+        left in Component.blocks. check is called between scans and MCU
+        rows, it could abort decoding by raising an exception
+        """
         self.frame.prepare()
+        observer = self.observer
+        stats = self.stats
 
         n_scans = len(self.scans)
         for n, scan in enumerate(self.scans):
+            if check:
+                check()
+            start = time.perf_counter()
             self.fp.seek(scan.position)
-            print('Scan {}/{}'.format(n, n_scans))
-            decode(self.fp, scan)
+            self.emit('scan_start', index=n, scans=n_scans, position=scan.position)
+            reader = stats.start_scan(scan)(self.fp) if stats else None
+            try:
+                for row in iter_decode(self.fp, scan, reader):
+                    if check:
+                        check()
+                    if observer:
+                        observer('rows', index=n, row=row)
+            finally:
+                if stats:
+                    stats.end_scan(scan, reader)
+            self.emit('scan_end', index=n, nbytes=self.get_scan_length(scan),
+                      blocks=get_scan_blocks(scan), elapsed=time.perf_counter() - start)
+        if stats:
+            stats.count_blocks(self.frame)
+        self.coefficients_decoded = True
+        self.finished_components = set()
+
+    def finish_component(self, comp, check=None):
+        """ Dequantization and IDCT of component, done once """
+        if comp.id not in self.finished_components:
+            start = time.perf_counter()
+            self.emit('finish_start', component=comp)
+            decode_component_finish(self.frame, comp, check)
+            self.finished_components.add(comp.id)
+            self.emit('finish_end', component=comp, blocks=len(comp.blocks),
+                      elapsed=time.perf_counter() - start)
+
+    def decode(self, check=None):
+        self.decode_coefficients(check)
+        for comp in self.frame.components:
+            self.finish_component(comp, check)
+
+    def ensure_decoded(self, components=None):
+        """ Decode scans if it was not done yet, and finish only the given
+        components, all by default
+        """
+        if not self.coefficients_decoded:
+            self.decode_coefficients()
+        for comp in components or self.frame.components:
+            self.finish_component(comp)
+
+    def decode_pipelined(self, executor=None, workers=None, check=None):
+        """ Decode with IDCT of finished MCU rows running in executor
+        concurrently with entropy decoding, shared process pool by default.
+        Only sequential images have final MCU rows before the end of the
+        scan, progressive images are decoded as usual. check is called
+        between MCU rows, as in decode
+        """
+        if self.frame.progressive:
+            self.decode(check)
+            return
 
-        print('Decode finishing..')
-        decode_finish(self.frame)
+        self.frame.prepare()
+        scan = self.scans[0]
+        self.fp.seek(scan.position)
+
+        if executor is None:
+            executor = get_pool(workers)
+        decode_pipelined(self.fp, scan, executor, check)
+        self.coefficients_decoded = True
+        self.finished_components = {c.id for c in self.frame.components}
+
+    def build_restart_index(self):
+        """ Index of restart intervals for random access, only sequential
+        images with restart intervals are supported
+        """
+        if self.frame.progressive:
+            raise ValueError('progressive image has no single scan to index')
+        self.frame.prepare(allocate=False)
+        self.restart_index = build_restart_index(self.fp, self.scans[0])
+        return self.restart_index
+
+    def decode_region(self, x, y, w, h):
+        """ Decode rectangle of the image, returns its pixels in the same
+        layout as get_linearized_data. Only blocks intersecting the
+        rectangle are dequantized and transformed. Sequential scans are
+        entropy-decoded only up to the last needed MCU, and only restart
+        intervals which intersect the rectangle are read. Progressive
+        scans refine previous values, so they are decoded completely
+        """
+        frame = self.frame
+        frame.prepare(allocate=False)
+        window = Window(frame, x, y, w, h)
 
-    def process(self):
+        if frame.progressive:
+            self.decode_coefficients()
+            window.copy_blocks(frame)
+        elif frame.restart_interval:
+            if self.restart_index is None:
+                self.build_restart_index()
+            decode_region_indexed(self.fp, self.scans[0], window, self.restart_index)
+        else:
+            decode_region_sequential(self.fp, self.scans[0], window)
+        return window.get_linearized_data()
+
+    def process(self, check=None, profile=False, profile_path=PROFILE_PATH):
+        """ Parse and decode, errors are reported as events and leave image
+        invalid. With profile, the run is profiled to pstats file
+        profile_path, and the report with allocations of each stage is
+        kept in profile_report
+        """
+        if profile:
+            self.profile_report = run_profiled(self, lambda: self.process(check), profile_path)
+            return
         try:
             is_valid = False
-            self.read_markers()
-            self.validate_markers()
-            self.parse_marker_blocks()
-            self.print_info()
-            self.decode()
+            self.parse()
+            self.emit('frame', image=self)
+            self.decode(check)
             is_valid = True
-        except EOFError:
-            print('Unexpected End-of-file')
-        except BadMarker as e:
-            print('Invalid JPEG structure:', e.msg)
-        except SyntaxError as e:
-            print('Invalid JPEG data:', e.msg)
+        except DECODE_ERRORS as e:
+            self.emit('error', message=get_error_message(e))
         finally:
             self.is_valid = is_valid
 
@@ -586,9 +860,31 @@ class JpegImage:
             return 'L'
         return None
 
+    @property
+    def pixels(self):
+        return self.get_linearized_data()
+
+    def get_plane(self, n=0):
+        """ Pixels of n-th component upsampled to image size, other
+        components are not finished
+        """
+        frame = self.frame
+        comp = frame.components[n]
+        self.ensure_decoded([comp])
+        scalex, scaley = comp.scale
+        width = comp.blocks_size[0] * 8
+
+        r = make_array('B', frame.w * frame.h)
+        for row in range(frame.h):
+            offset = (row // scaley) * width
+            for col in range(frame.w):
+                r[row * frame.w + col] = comp.data[offset + col // scalex]
+        return r
+
     def get_linearized_data(self):
         frame = self.frame
         n = len(frame.components)
+        self.ensure_decoded()
 
         r = make_array('B', frame.w * frame.h * n)
         for row in range(frame.h):
@@ -596,7 +892,7 @@ class JpegImage:
                 coord = row * frame.w + col
                 for idx, c in enumerate(frame.components):
                     scalex, scaley = c.scale
-                    width, _ = c.size
+                    width = c.blocks_size[0] * 8
 
                     coord1 = (row // scaley) * width + (col // scalex)
                     r[coord * n + idx] = c.data[coord1]
@@ -0,0 +1,336 @@
+import struct
+from io import BytesIO
+
+from . import huffman, tables
+from .core import Frame, Scan
+from .fdct import fdct_2d
+from .scan_encode import encode, get_code_table, SymbolCounter
+from .scan_encode import get_progressive_fn, write_eobrun
+from .zigzag import dezigzag
+from .utils import make_array
+
+
+SOI_CODE = 0xFFD8
+EOI_CODE = 0xFFD9
+SOF0_CODE = 0xFFC0
+SOF2_CODE = 0xFFC2
+DHT_CODE = 0xFFC4
+SOS_CODE = 0xFFDA
+DQT_CODE = 0xFFDB
+DRI_CODE = 0xFFDD
+APP0_CODE = 0xFFE0
+
+default_sampling = {
+    'L': ((1, 1),),
+    'YCbCr': ((2, 2), (1, 1), (1, 1)),
+}
+
+def write_marker(fp, code):
+    fp.write(struct.pack('>H', code))
+
+def write_segment(fp, code, payload):
+    if len(payload) + 2 > 0xFFFF:
+        raise ValueError('segment is too long')
+    fp.write(struct.pack('>HH', code, len(payload) + 2))
+    fp.write(payload)
+
+def write_JFIF(fp):
+    # version 1.01, no units, 1:1 pixel aspect ratio, no thumbnail
+    payload = b'JFIF\x00' + struct.pack('>BBBHHBB', 1, 1, 0, 1, 1, 0, 0)
+    write_segment(fp, APP0_CODE, payload)
+
+def write_DQT(fp, quantization):
+    payload = bytearray()
+    for qc, table in sorted(quantization.items()):
+        payload.append(qc)
+        payload.extend(table[z] for z in dezigzag)
+    write_segment(fp, DQT_CODE, payload)
+
+def write_SOF(fp, frame, code=SOF0_CODE):
+    payload = bytearray(struct.pack('>BHHB', 8, frame.h, frame.w, len(frame.components)))
+    for comp in frame.components:
+        h, v = comp.sampling
+        payload.extend(struct.pack('3B', comp.id, (h << 4) | v, comp.qc))
+    write_segment(fp, code, payload)
+
+def write_DHT(fp, huffman_tables):
+    """ huffman_tables is a list of (class, id, codes), class is 0 for DC
+    and 1 for AC tables
+    """
+    output = BytesIO()
+    for tc, th, codes in huffman_tables:
+        output.write(bytes([(tc << 4) | th]))
+        huffman.encode_table(codes, output)
+    write_segment(fp, DHT_CODE, output.getvalue())
+
+def write_DRI(fp, restart_interval):
+    write_segment(fp, DRI_CODE, struct.pack('>H', restart_interval))
+
+def write_SOS(fp, scan, table_ids):
+    payload = bytearray([len(scan.components)])
+    for comp in scan.components:
+        th = table_ids[comp.id]
+        payload.extend((comp.id, (th << 4) | th))
+    payload.extend((scan.spectral_start, scan.spectral_end,
+                    (scan.approx_high << 4) | scan.approx_low))
+    write_segment(fp, SOS_CODE, payload)
+
+def get_table_ids(frame):
+    """ The first component (luminance) uses table 0,
+    others (chrominance) share table 1
+    """
+    return {c.id: 0 if i == 0 else 1 for i, c in enumerate(frame.components)}
+
+def get_standard_huffman_tables(frame):
+    ids = set(get_table_ids(frame).values())
+    standard = {
+        0: (tables.luminance_dc, tables.luminance_ac),
+        1: (tables.chrominance_dc, tables.chrominance_ac),
+    }
+    return {th: tuple(tables.get_huffman_codes(t) for t in standard[th])
+            for th in ids}
+
+def make_scan(frame, code_tables):
+    table_ids = get_table_ids(frame)
+    scan = Scan(frame)
+    scan.spectral_end = 63
+    for comp in frame.components:
+        dc_table, ac_table = code_tables[table_ids[comp.id]]
+        scan.huffman_dc[comp.id] = dc_table
+        scan.huffman_ac[comp.id] = ac_table
+        scan.components.append(comp)
+    return scan
+
+def get_optimal_huffman_tables(frame):
+    """ Gather symbol statistics by dry-run of the scan encoding and build
+    Huffman tables (limited to 16 bits codes) from them
+    """
+    ids = set(get_table_ids(frame).values())
+    counters = {th: (SymbolCounter(), SymbolCounter()) for th in ids}
+    encode(BytesIO(), make_scan(frame, counters))
+    return {th: tuple(huffman.get_length_limited_table(c.freq) for c in pair)
+            for th, pair in counters.items()}
+
+def write_frame(fp, frame, huffman_tables=None, optimize=False, segments=None):
+    """ Write frame of quantized coefficients (as Component.blocks are before
+    finish_component) as baseline JPEG with a single interleaved scan.
+    If optimize is set, Huffman tables are built for this image.
+    segments is a list of (marker code, payload) written after SOI, JFIF
+    header is written if it is not given
+    """
+    if huffman_tables is None:
+        if optimize:
+            huffman_tables = get_optimal_huffman_tables(frame)
+        else:
+            huffman_tables = get_standard_huffman_tables(frame)
+
+    write_marker(fp, SOI_CODE)
+    if segments is None:
+        write_JFIF(fp)
+    else:
+        for code, payload in segments:
+            write_segment(fp, code, payload)
+    write_DQT(fp, frame.quantization)
+    write_SOF(fp, frame)
+    write_DHT(fp, [(tc, th, pair[tc])
+                   for th, pair in sorted(huffman_tables.items())
+                   for tc in (0, 1)])
+    if frame.restart_interval:
+        write_DRI(fp, frame.restart_interval)
+
+    code_tables = {th: tuple(get_code_table(codes) for codes in pair)
+                   for th, pair in huffman_tables.items()}
+    scan = make_scan(frame, code_tables)
+    write_SOS(fp, scan, get_table_ids(frame))
+    encode(fp, scan)
+    write_marker(fp, EOI_CODE)
+
+def get_progressive_script(frame):
+    """ Standard progression of IJG library, list of (component indexes,
+    spectral start, spectral end, approximation high, approximation low)
+    """
+    all_components = tuple(range(len(frame.components)))
+    if len(frame.components) == 3:
+        return [
+            (all_components, 0, 0, 0, 1),
+            ((0,), 1, 5, 0, 2),
+            ((2,), 1, 63, 0, 1),
+            ((1,), 1, 63, 0, 1),
+            ((0,), 6, 63, 0, 2),
+            ((0,), 1, 63, 2, 1),
+            (all_components, 0, 0, 1, 0),
+            ((2,), 1, 63, 1, 0),
+            ((1,), 1, 63, 1, 0),
+            ((0,), 1, 63, 1, 0),
+        ]
+    script = [(all_components, 0, 0, 0, 1)]
+    script += [((i,), 1, 5, 0, 2) for i in all_components]
+    script += [((i,), 6, 63, 0, 2) for i in all_components]
+    script += [((i,), 1, 63, 2, 1) for i in all_components]
+    script += [(all_components, 0, 0, 1, 0)]
+    script += [((i,), 1, 63, 1, 0) for i in all_components]
+    return script
+
+def make_progressive_scan(frame, indexes, ss, se, ah, al):
+    scan = Scan(frame)
+    scan.components = [frame.components[i] for i in indexes]
+    scan.spectral_start = ss
+    scan.spectral_end = se
+    scan.approx_high = ah
+    scan.approx_low = al
+    return scan
+
+def write_progressive_scan(fp, scan, table_ids):
+    """ Write scan with Huffman tables optimal for it, progressive scans
+    use EOB runs which are missing in the standard tables
+    """
+    encode_fn = get_progressive_fn(scan)
+    flush_fn = None if scan.is_dc else write_eobrun
+
+    if not (scan.is_dc and scan.is_refine):
+        tc = 0 if scan.is_dc else 1
+        huffman_codes = scan.huffman_dc if scan.is_dc else scan.huffman_ac
+        counters = {th: SymbolCounter() for th in table_ids.values()}
+        for comp in scan.components:
+            huffman_codes[comp.id] = counters[table_ids[comp.id]]
+        encode(BytesIO(), scan, encode_fn, flush_fn)
+        scan.prog_state = None
+
+        tables = {th: huffman.get_length_limited_table(counter.freq)
+                  for th, counter in counters.items() if counter.freq}
+        write_DHT(fp, [(tc, th, codes) for th, codes in sorted(tables.items())])
+        for comp in scan.components:
+            huffman_codes[comp.id] = get_code_table(tables[table_ids[comp.id]])
+
+    write_SOS(fp, scan, table_ids)
+    encode(fp, scan, encode_fn, flush_fn)
+
+def write_progressive_frame(fp, frame, segments=None, script=None):
+    """ Write frame of quantized coefficients as progressive JPEG,
+    script is a list of scans as given by get_progressive_script
+    """
+    if script is None:
+        script = get_progressive_script(frame)
+
+    write_marker(fp, SOI_CODE)
+    if segments is None:
+        write_JFIF(fp)
+    else:
+        for code, payload in segments:
+            write_segment(fp, code, payload)
+    write_DQT(fp, frame.quantization)
+    write_SOF(fp, frame, SOF2_CODE)
+    if frame.restart_interval:
+        write_DRI(fp, frame.restart_interval)
+
+    for indexes, ss, se, ah, al in script:
+        scan = make_progressive_scan(frame, indexes, ss, se, ah, al)
+        table_ids = get_table_ids(frame)
+        table_ids = {comp.id: table_ids[comp.id] for comp in scan.components}
+        write_progressive_scan(fp, scan, table_ids)
+    write_marker(fp, EOI_CODE)
+
+def clamp_byte(x):
+    return 0 if x < 0 else 255 if x > 255 else x
+
+def rgb_to_ycbcr(pixels):
+    result = make_array('B', len(pixels))
+    for c in range(0, len(pixels), 3):
+        r, g, b = pixels[c:c+3]
+        result[c] = clamp_byte(round(0.299 * r + 0.587 * g + 0.114 * b))
+        result[c+1] = clamp_byte(round(-0.168736 * r - 0.331264 * g + 0.5 * b + 128))
+        result[c+2] = clamp_byte(round(0.5 * r - 0.418688 * g - 0.081312 * b + 128))
+    return result
+
+def set_component_samples(comp, pixels, idx, n, w, h):
+    """ Fill component data from interleaved pixels, with downsampling by
+    averaging and padding by edge replication
+    """
+    data = comp.data
+    scalex, scaley = comp.scale
+    w2, h2 = comp.size
+    width = comp.blocks_size[0] * 8
+    height = comp.blocks_size[1] * 8
+    area = scalex * scaley
+
+    for row in range(height):
+        y = min(row, h2 - 1) * scaley
+        ys = range(y, min(y + scaley, h))
+        for col in range(width):
+            x = min(col, w2 - 1) * scalex
+            if area == 1:
+                value = pixels[(y * w + x) * n + idx]
+            else:
+                xs = range(x, min(x + scalex, w))
+                total = sum(pixels[(yy * w + xx) * n + idx] for yy in ys for xx in xs)
+                count = len(ys) * len(xs)
+                value = (total + count // 2) // count
+            data[row * width + col] = value
+
+def quantize(value, divisor):
+    if value < 0:
+        return -((divisor // 2 - value) // divisor)
+    return (value + divisor // 2) // divisor
+
+def encode_block_start(block_data, data, row, col, width, qt):
+    """ Level shift, forward DCT and quantization of 8x8 samples """
+    offset = row * width + col
+    for i in range(8):
+        for j in range(8):
+            block_data[8 * i + j] = data[offset + i * width + j] - 128
+    fdct_2d(block_data)
+    for c in range(64):
+        # FDCT output is scaled up by 8
+        block_data[c] = quantize(block_data[c], qt[c] << 3)
+
+def encode_start(frame):
+    for comp in frame.components:
+        data = comp.data
+        blocks = comp.blocks
+        w, h = comp.blocks_size
+        qt = frame.quantization[comp.qc]
+        for row in range(h):
+            for col in range(w):
+                block = blocks[row * w + col]
+                encode_block_start(block, data, row * 8, col * 8, w * 8, qt)
+
+def make_frame(fmt, w, h, quality, sampling):
+    if sampling is None:
+        sampling = default_sampling[fmt]
+    if len(sampling) != len(default_sampling[fmt]):
+        raise ValueError('bad sampling for {} format'.format(fmt))
+
+    frame = Frame(SOF0_CODE, w, h)
+    frame.quantization = {
+        0: tables.scale_quantization(tables.luminance_quantization, quality),
+    }
+    if fmt == 'YCbCr':
+        frame.quantization[1] = tables.scale_quantization(
+            tables.chrominance_quantization, quality)
+    for i, (sh, sv) in enumerate(sampling):
+        frame.add_component(i + 1, sh, sv, 0 if i == 0 else 1)
+    return frame
+
+def write_jpeg(fp, fmt, w, h, pixels, quality=75, sampling=None, optimize=False,
+               restart_interval=None):
+    """ Encode pixels, interleaved 'L', 'YCbCr' or 'RGB' bytes (as given by
+    JpegImage.get_linearized_data), to baseline JPEG
+    """
+    if fmt == 'RGB':
+        pixels = rgb_to_ycbcr(pixels)
+        fmt = 'YCbCr'
+    if fmt not in default_sampling:
+        raise ValueError('unsupported format {}'.format(fmt))
+    if not 0 < w <= 0xFFFF or not 0 < h <= 0xFFFF:
+        raise ValueError('bad image size')
+    n = len(default_sampling[fmt])
+    if len(pixels) != w * h * n:
+        raise ValueError('bad pixels length')
+
+    frame = make_frame(fmt, w, h, quality, sampling)
+    frame.restart_interval = restart_interval
+    frame.prepare()
+    for idx, comp in enumerate(frame.components):
+        set_component_samples(comp, pixels, idx, n, w, h)
+    encode_start(frame)
+    write_frame(fp, frame, optimize=optimize)
@@ -0,0 +1,84 @@
+""" Decoding events. JpegImage calls observer(event, **info) with:
+
+    parse_start
+    parse_end       elapsed
+    marker          code, name, position
+    frame           image
+    scan_start      index, scans, position -- scans is None in stream
+    rows            index, row         -- MCU row of scan is decoded
+    scan_end        index, nbytes, blocks, elapsed
+    finish_start    component
+    finish_end      component, blocks, elapsed
+    error           message
+
+Times are wall time in seconds. Without observer decoding is silent.
+"""
+
+
+class Observer:
+    """ Dispatches event to on_<event> method, if it's defined """
+
+    def __call__(self, event, **info):
+        handler = getattr(self, 'on_' + event, None)
+        if handler:
+            handler(**info)
+
+
+class PrintObserver(Observer):
+    """ Prints image info, progress and errors to stdout """
+
+    def on_frame(self, image):
+        image.print_info()
+
+    def on_scan_start(self, index, scans, **info): # pylint: disable=unused-argument
+        if scans is None:
+            print('Scan {}'.format(index))
+        else:
+            print('Scan {}/{}'.format(index, scans))
+
+    def on_finish_start(self, component):
+        print('Finishing component {}'.format(component.id))
+
+    def on_error(self, message):
+        print(message)
+
+
+class StageTimer(Observer):
+    """ Collects wall time of parsing, each scan and finishing of every
+    decoded image
+    """
+
+    def __init__(self):
+        self.images = []
+
+    def start_image(self):
+        self.images.append({'parse': 0.0, 'scans': [], 'finish': 0.0})
+
+    @property
+    def current(self):
+        if not self.images:
+            self.start_image()
+        return self.images[-1]
+
+    def on_parse_start(self):
+        self.start_image()
+
+    def on_parse_end(self, elapsed):
+        self.current['parse'] += elapsed
+
+    def on_scan_end(self, elapsed, **info): # pylint: disable=unused-argument
+        self.current['scans'].append(elapsed)
+
+    def on_finish_end(self, elapsed, **info): # pylint: disable=unused-argument
+        self.current['finish'] += elapsed
+
+    def report(self):
+        """ Stage times of each image, with totals of entropy decoding
+        and of all stages
+        """
+        result = []
+        for stages in self.images:
+            entropy = sum(stages['scans'])
+            total = stages['parse'] + entropy + stages['finish']
+            result.append(dict(stages, entropy=entropy, total=total))
+        return result
@@ -0,0 +1,70 @@
+""" Minimal Exif (TIFF) parsing, only what is needed to locate
+embedded thumbnail
+"""
+import struct
+
+
+JPEG_INTERCHANGE_FORMAT = 0x0201
+JPEG_INTERCHANGE_FORMAT_LENGTH = 0x0202
+
+SHORT = 3
+LONG = 4
+
+
+def get_byte_order(data):
+    order = data[:2]
+    if order == b'II':
+        return '<'
+    if order == b'MM':
+        return '>'
+    return None
+
+def read_ifd(data, offset, endian):
+    """ Read IFD entries at offset
+    Returns dictionary tag -> value (only SHORT and LONG values with count 1
+    are kept) and offset of the next IFD
+    """
+    if offset + 2 > len(data):
+        return None, 0
+    count = struct.unpack(endian + 'H', data[offset:offset+2])[0]
+    end = offset + 2 + count * 12
+    if end + 4 > len(data):
+        return None, 0
+
+    entries = {}
+    for i in range(count):
+        pos = offset + 2 + i * 12
+        tag, typ, n = struct.unpack(endian + 'HHI', data[pos:pos+8])
+        if n != 1:
+            continue
+        if typ == SHORT:
+            entries[tag] = struct.unpack(endian + 'H', data[pos+8:pos+10])[0]
+        elif typ == LONG:
+            entries[tag] = struct.unpack(endian + 'I', data[pos+8:pos+12])[0]
+    next_offset = struct.unpack(endian + 'I', data[end:end+4])[0]
+    return entries, next_offset
+
+def get_exif_thumbnail(data):
+    """ Get JPEG thumbnail bytes from Exif payload (TIFF structure following
+    'Exif\\x00\\x00' header), the thumbnail is referenced by IFD1
+    Returns None if there is no thumbnail or data is malformed
+    """
+    endian = get_byte_order(data)
+    if not endian or len(data) < 8:
+        return None
+    magic, ifd0_offset = struct.unpack(endian + 'HI', data[2:8])
+    if magic != 42:
+        return None
+
+    _, ifd1_offset = read_ifd(data, ifd0_offset, endian)
+    if not ifd1_offset:
+        return None
+    entries, _ = read_ifd(data, ifd1_offset, endian)
+    if not entries:
+        return None
+
+    offset = entries.get(JPEG_INTERCHANGE_FORMAT)
+    length = entries.get(JPEG_INTERCHANGE_FORMAT_LENGTH)
+    if not offset or not length or offset + length > len(data):
+        return None
+    return data[offset:offset+length]
@@ -0,0 +1,120 @@
+# Integer forward DCT, "slow but accurate" algorithm of IJG library
+# (Loeffler, Ligtenberg, Moschytz), result is scaled up by 8
+
+CONST_BITS = 13
+PASS1_BITS = 2
+
+c0298 = 2446  # 8192*0.298631336
+c0390 = 3196  # 8192*0.390180644
+c0541 = 4433  # 8192*0.541196100
+c0765 = 6270  # 8192*0.765366865
+c0899 = 7373  # 8192*0.899976223
+c1175 = 9633  # 8192*1.175875602
+c1501 = 12299 # 8192*1.501321110
+c1847 = 15137 # 8192*1.847759065
+c1961 = 16069 # 8192*1.961570560
+c2053 = 16819 # 8192*2.053119869
+c2562 = 20995 # 8192*2.562915447
+c3072 = 25172 # 8192*3.072711026
+
+shift1 = CONST_BITS - PASS1_BITS
+round1 = 1 << (shift1 - 1)
+shift2 = CONST_BITS + PASS1_BITS
+round2 = 1 << (shift2 - 1)
+round_dc = 1 << (PASS1_BITS - 1)
+
+def fdct_2d(src):
+    # Horizontal 1-D FDCT
+    for y in range(0, 8):
+        y8 = y * 8
+
+        tmp0 = src[y8+0] + src[y8+7]
+        tmp7 = src[y8+0] - src[y8+7]
+        tmp1 = src[y8+1] + src[y8+6]
+        tmp6 = src[y8+1] - src[y8+6]
+        tmp2 = src[y8+2] + src[y8+5]
+        tmp5 = src[y8+2] - src[y8+5]
+        tmp3 = src[y8+3] + src[y8+4]
+        tmp4 = src[y8+3] - src[y8+4]
+
+        # Even part
+        tmp10 = tmp0 + tmp3
+        tmp13 = tmp0 - tmp3
+        tmp11 = tmp1 + tmp2
+        tmp12 = tmp1 - tmp2
+
+        src[y8+0] = (tmp10 + tmp11) << PASS1_BITS
+        src[y8+4] = (tmp10 - tmp11) << PASS1_BITS
+
+        z1 = (tmp12 + tmp13) * c0541
+        src[y8+2] = (z1 + tmp13 * c0765 + round1) >> shift1
+        src[y8+6] = (z1 - tmp12 * c1847 + round1) >> shift1
+
+        # Odd part
+        z1 = tmp4 + tmp7
+        z2 = tmp5 + tmp6
+        z3 = tmp4 + tmp6
+        z4 = tmp5 + tmp7
+        z5 = (z3 + z4) * c1175
+
+        tmp4 *= c0298
+        tmp5 *= c2053
+        tmp6 *= c3072
+        tmp7 *= c1501
+        z1 *= -c0899
+        z2 *= -c2562
+        z3 = z3 * -c1961 + z5
+        z4 = z4 * -c0390 + z5
+
+        src[y8+7] = (tmp4 + z1 + z3 + round1) >> shift1
+        src[y8+5] = (tmp5 + z2 + z4 + round1) >> shift1
+        src[y8+3] = (tmp6 + z2 + z3 + round1) >> shift1
+        src[y8+1] = (tmp7 + z1 + z4 + round1) >> shift1
+
+    # Vertical 1-D FDCT
+    for x in range(0, 8):
+
+        tmp0 = src[8*0+x] + src[8*7+x]
+        tmp7 = src[8*0+x] - src[8*7+x]
+        tmp1 = src[8*1+x] + src[8*6+x]
+        tmp6 = src[8*1+x] - src[8*6+x]
+        tmp2 = src[8*2+x] + src[8*5+x]
+        tmp5 = src[8*2+x] - src[8*5+x]
+        tmp3 = src[8*3+x] + src[8*4+x]
+        tmp4 = src[8*3+x] - src[8*4+x]
+
+        # Even part
+        tmp10 = tmp0 + tmp3
+        tmp13 = tmp0 - tmp3
+        tmp11 = tmp1 + tmp2
+        tmp12 = tmp1 - tmp2
+
+        src[8*0+x] = (tmp10 + tmp11 + round_dc) >> PASS1_BITS
+        src[8*4+x] = (tmp10 - tmp11 + round_dc) >> PASS1_BITS
+
+        z1 = (tmp12 + tmp13) * c0541
+        src[8*2+x] = (z1 + tmp13 * c0765 + round2) >> shift2
+        src[8*6+x] = (z1 - tmp12 * c1847 + round2) >> shift2
+
+        # Odd part
+        z1 = tmp4 + tmp7
+        z2 = tmp5 + tmp6
+        z3 = tmp4 + tmp6
+        z4 = tmp5 + tmp7
+        z5 = (z3 + z4) * c1175
+
+        tmp4 *= c0298
+        tmp5 *= c2053
+        tmp6 *= c3072
+        tmp7 *= c1501
+        z1 *= -c0899
+        z2 *= -c2562
+        z3 = z3 * -c1961 + z5
+        z4 = z4 * -c0390 + z5
+
+        src[8*7+x] = (tmp4 + z1 + z3 + round2) >> shift2
+        src[8*5+x] = (tmp5 + z2 + z4 + round2) >> shift2
+        src[8*3+x] = (tmp6 + z2 + z3 + round2) >> shift2
+        src[8*1+x] = (tmp7 + z1 + z4 + round2) >> shift2
+
+    return src
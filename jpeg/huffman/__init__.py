@@ -1,4 +1,5 @@
 from .core import get_frequences
 from .core import get_huffman_table
+from .core import get_length_limited_table
 from .encoding import encode, encode_table
 from .decoding import decode, decode_table
@@ -94,6 +94,94 @@ def get_huffman_table(freq):
     return codes
 
 
+def get_code_lengths(freq, max_length=16):
+    """ Code length of each symbol, limited to max_length bits, according to
+    Annex K.2 of JPEG specification. One extra code is reserved, so none of
+    the codes consists of all 1-bits.
+    Returns list of number of codes of each length 1..max_length and list of
+    symbols ordered by code length, both are empty of codes if there are no
+    symbols
+    """
+    if not freq:
+        return [0] * max_length, []
+    symbols = sorted(freq)
+    n = len(symbols)
+    # the last is the reserved symbol
+    weights = [freq[ch] for ch in symbols] + [1]
+    codesize = [0] * (n + 1)
+    others = [-1] * (n + 1)
+
+    while True:
+        # the least frequent, the one with larger index if tied
+        c1 = c2 = -1
+        for i, weight in enumerate(weights):
+            if not weight:
+                continue
+            if c1 < 0 or weight <= weights[c1]:
+                c1, c2 = i, c1
+            elif c2 < 0 or weight <= weights[c2]:
+                c2 = i
+        if c2 < 0:
+            break
+
+        weights[c1] += weights[c2]
+        weights[c2] = 0
+
+        codesize[c1] += 1
+        while others[c1] >= 0:
+            c1 = others[c1]
+            codesize[c1] += 1
+        others[c1] = c2
+
+        codesize[c2] += 1
+        while others[c2] >= 0:
+            c2 = others[c2]
+            codesize[c2] += 1
+
+    bits = [0] * (max(codesize) + 1)
+    for size in codesize:
+        if size:
+            bits[size] += 1
+
+    # K.3 - move too long codes to shorter lengths
+    for i in range(len(bits) - 1, max_length, -1):
+        while bits[i] > 0:
+            j = i - 2
+            while bits[j] == 0:
+                j -= 1
+            bits[i] -= 2
+            bits[i - 1] += 1
+            bits[j + 1] += 2
+            bits[j] -= 1
+
+    bits = (bits + [0] * max_length)[1:max_length + 1]
+    # remove the reserved code, it is the longest one
+    i = max_length - 1
+    while bits[i] == 0:
+        i -= 1
+    bits[i] -= 1
+
+    order = sorted(range(n), key=lambda i: codesize[i])
+    return bits, [symbols[i] for i in order]
+
+
+def get_length_limited_table(freq, max_length=16):
+    """ Canonical Huffman encoding table with code length limited to
+    max_length bits. Returns a dictionary, where key is element, value is
+    (1, 0, 1) tuple, ordered by code length
+    """
+    bits, values = get_code_lengths(freq, max_length)
+    codes = dict()
+    code = 0
+    it = iter(values)
+    for length, count in enumerate(bits, 1):
+        for _ in range(count):
+            codes[next(it)] = byte_to_bits(code, length)
+            code += 1
+        code = code << 1
+    return codes
+
+
 def check_huffman_table(codes):
     """ Check huffman table for validity
     """
@@ -105,7 +193,7 @@ def check_huffman_table(codes):
     for value in codeslist:
         size = len(value)
         if size != last_size:
-            code = code << 1
+            code = code << (size - last_size)
             last_size = size
         bits = byte_to_bits(code, size)
         if bits not in revcodes:
@@ -8,18 +8,31 @@ read8 = lambda inp: struct.unpack('B', inp.read(1))[0]
 read16 = lambda inp: struct.unpack('<H', inp.read(2))[0]
 
 
-class BitDecoder:
+class DecodeTable:
+    """ Lookup tables of Huffman codes: symbol by (length, code) and
+    number of codes of each length. Shared by decoders, never modified
+    """
     def __init__(self, codes):
+        self.codes = codes
         self.rcodes = dict()
         self.lcodes = list(repeat(0, 17))
-        self.bits_len = 0
-        self.cached = 0
         for code, bits in codes.items():
             length = len(bits)
             val = bits_to_byte(bits)
             self.rcodes[(length, val)] = code
             self.lcodes[length] += 1
 
+
+class BitDecoder:
+    def __init__(self, codes, table=None):
+        if table is None:
+            table = DecodeTable(codes)
+        self.codes = codes
+        self.rcodes = table.rcodes
+        self.lcodes = table.lcodes
+        self.bits_len = 0
+        self.cached = 0
+
     def __call__(self, bit):
         assert bit in (0, 1)
         if self.bits_len + 1 > 16:
@@ -1,5 +1,6 @@
 from ..core import Node, iter_nodes, iter_leafs, get_frequences
 from ..core import get_huffman_table, check_huffman_table
+from ..core import get_code_lengths, get_length_limited_table
 
 
 def test_iter_nodes():
@@ -45,3 +46,35 @@ def test_huffman_table4():
     h = get_huffman_table(freq)
     assert check_huffman_table(h)
 
+
+
+def test_length_limited_table():
+    freq = get_frequences('A_DEAD_DAD_CEDED_A_BAD_BABE_A_BEADED_ABACA_BED')
+    h = get_length_limited_table(freq)
+    assert check_huffman_table(h)
+    assert set(h) == set(freq)
+
+
+def test_length_limited_table_limit():
+    fib = [1, 1]
+    for _ in range(30):
+        fib.append(fib[-1] + fib[-2])
+    freq = dict(enumerate(fib))
+    h = get_length_limited_table(freq)
+    assert check_huffman_table(h)
+    assert max(len(code) for code in h.values()) == 16
+    h = get_length_limited_table(freq, max_length=8)
+    assert check_huffman_table(h)
+    assert max(len(code) for code in h.values()) == 8
+
+
+def test_length_limited_table_no_ones():
+    h = get_length_limited_table({0: 1, 1: 1, 2: 1, 3: 1})
+    assert all(0 in code for code in h.values())
+    h = get_length_limited_table({7: 5})
+    assert h == {7: (0,)}
+
+
+def test_length_limited_table_empty():
+    assert get_code_lengths({}) == ([0] * 16, [])
+    assert get_length_limited_table({}) == {}
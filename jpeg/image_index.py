@@ -0,0 +1,212 @@
+""" Persistent index of parsed JPEG image: marker table, quantization and
+Huffman tables, frame and scans descriptors, and optionally restart
+intervals offsets. Opening an image from the index skips reading and
+parsing of markers, it goes straight to entropy decoding. Index is used
+only if file size, modification time and hash of the header match, so a
+rewritten file is parsed again.
+"""
+import os
+import json
+import hashlib
+
+from .core import JpegImage, Frame, Scan, SOF
+from .huffman.decoding import BitDecoder
+from .index import RestartIndex
+from .table_cache import get_huffman_table, get_quantization_table
+from .zigzag import dezigzag
+
+
+INDEX_VERSION = 4
+SIDECAR_SUFFIX = '.idx.json'
+
+image_flags = ('jfif', 'jfxx', 'exif', 'adobe', 'adobe_color_transform',
+               'restart_interval', 'dnl_num_lines')
+
+
+def get_file_size(fp):
+    pos = fp.tell()
+    try:
+        return fp.seek(0, 2)
+    finally:
+        fp.seek(pos)
+
+def get_file_mtime(fp):
+    """ Modification time in nanoseconds, None if fp is not a file """
+    try:
+        return os.fstat(fp.fileno()).st_mtime_ns
+    except (AttributeError, OSError):
+        return None
+
+def get_header_hash(fp, length):
+    """ Hash of the first length bytes of file, markers before the first
+    scan data
+    """
+    pos = fp.tell()
+    try:
+        fp.seek(0)
+        return hashlib.sha1(fp.read(length)).hexdigest()
+    finally:
+        fp.seek(pos)
+
+def get_file_signature(fp, header_length):
+    return {
+        'size': get_file_size(fp),
+        'mtime_ns': get_file_mtime(fp),
+        'header': [header_length, get_header_hash(fp, header_length)],
+    }
+
+def check_file_signature(fp, signature):
+    """ Raises ValueError if file was changed since index was made,
+    size and header are compared first, as they are cheap to get
+    """
+    if signature['size'] != get_file_size(fp):
+        raise ValueError('index does not match the file size')
+    if signature['mtime_ns'] != get_file_mtime(fp):
+        raise ValueError('index does not match the file modification time')
+    length, header_hash = signature['header']
+    if header_hash != get_header_hash(fp, length):
+        raise ValueError('index does not match the file header')
+
+def dump_huffman_codes(codes):
+    """ Huffman codes as BITS and HUFFVAL lists, as in DHT segment """
+    bits = [0] * 16
+    values = []
+    for ch, code in sorted(codes.items(), key=lambda x: (len(x[1]), x[1])):
+        bits[len(code) - 1] += 1
+        values.append(ch)
+    return [bits, values]
+
+def load_huffman_table(table):
+    bits, values = table
+    return get_huffman_table(bytes(bits) + bytes(values))
+
+def dump_quantization_table(table):
+    """ Table values in zigzag order, as in DQT segment """
+    return [table[z] for z in dezigzag]
+
+def load_quantization_table(table):
+    if len(table) != 64:
+        raise ValueError('bad quantization table')
+    return get_quantization_table(bytes(table))
+
+def make_index(img):
+    """ Index of parsed image as JSON-compatible dictionary """
+    frame = img.frame
+    tables = []
+
+    def table_id(decoder):
+        if decoder is None:
+            return None
+        table = dump_huffman_codes(decoder.codes)
+        if table not in tables:
+            tables.append(table)
+        return tables.index(table)
+
+    scans = []
+    for scan in img.scans:
+        scans.append({
+            'position': scan.position,
+            'components': [[c.id, table_id(scan.huffman_dc[c.id]), table_id(scan.huffman_ac[c.id])]
+                           for c in scan.components],
+            'spectral': [scan.spectral_start, scan.spectral_end],
+            'approx': [scan.approx_high, scan.approx_low],
+        })
+
+    return {
+        'version': INDEX_VERSION,
+        'file': get_file_signature(img.fp, img.scans[0].position),
+        'markers': [list(m) for m in img.marker_codes],
+        'image': {name: getattr(img, name) for name in image_flags},
+        'quantization': {str(qc): dump_quantization_table(table)
+                         for qc, table in img.quantization.items()},
+        'huffman': tables,
+        'frame': {
+            'marker': next(code for code, marker, _ in img.marker_codes if marker == SOF),
+            'size': [frame.w, frame.h],
+            'components': [[c.id, c.sampling[0], c.sampling[1], c.qc] for c in frame.components],
+        },
+        'scans': scans,
+        'restart': img.restart_index.to_dict() if img.restart_index else None,
+    }
+
+def apply_index(img, index):
+    """ Restore parsed state of image from index """
+    if index.get('version') != INDEX_VERSION:
+        raise ValueError('unsupported index version')
+    check_file_signature(img.fp, index['file'])
+
+    img.marker_codes = [tuple(m) for m in index['markers']]
+    for name, value in index['image'].items():
+        setattr(img, name, value)
+    img.quantization = {int(qc): load_quantization_table(table)
+                        for qc, table in index['quantization'].items()}
+    tables = [load_huffman_table(table) for table in index['huffman']]
+
+    info = index['frame']
+    w, h = info['size']
+    frame = img.frame = Frame(info['marker'], w, h)
+    frame.restart_interval = img.restart_interval
+    frame.quantization = img.quantization
+    for idx, sh, sv, qc in info['components']:
+        frame.add_component(idx, sh, sv, qc)
+
+    decoder = lambda i: BitDecoder(tables[i].codes, tables[i]) if i is not None else None
+    img.scans = []
+    for info in index['scans']:
+        scan = Scan(frame)
+        scan.position = info['position']
+        for idx, dc_id, ac_id in info['components']:
+            scan.components.append(frame.components_ids[idx])
+            scan.huffman_dc[idx] = decoder(dc_id)
+            scan.huffman_ac[idx] = decoder(ac_id)
+        scan.spectral_start, scan.spectral_end = info['spectral']
+        scan.approx_high, scan.approx_low = info['approx']
+        img.scans.append(scan)
+
+    if index['restart']:
+        img.restart_index = RestartIndex.from_dict(index['restart'])
+    return img
+
+def save_index(img, fp):
+    json.dump(make_index(img), fp, separators=(',', ':'))
+
+def load_index(img, fp):
+    return apply_index(img, json.load(fp))
+
+def get_index_path(path, cache_dir=None):
+    """ Sidecar next to the file, or a file in cache directory named by
+    the file path, size and modification time
+    """
+    if cache_dir is None:
+        return path + SIDECAR_SUFFIX
+    stat = os.stat(path)
+    key = '{}:{}:{}'.format(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, name + SIDECAR_SUFFIX)
+
+def open_indexed(fp, path, cache_dir=None):
+    """ JpegImage of opened file fp, parsed state is loaded from index of
+    path if it exists and matches the file, otherwise the image is parsed
+    and the index is saved, if the index location is writable
+    """
+    index_path = get_index_path(path, cache_dir)
+    img = JpegImage(fp)
+    try:
+        with open(index_path) as f:
+            return load_index(img, f)
+    except (OSError, ValueError, KeyError, TypeError):
+        # missing, stale or malformed index
+        pass
+
+    img = JpegImage(fp)
+    img.parse()
+    if img.frame.restart_interval and not img.frame.progressive:
+        img.build_restart_index()
+    try:
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+        with open(index_path, 'w') as f:
+            save_index(img, f)
+    except OSError:
+        pass
+    return img
@@ -0,0 +1,76 @@
+""" Index of restart intervals of sequential scan, gives random access to
+entropy-coded data of huge images
+"""
+from .scan_decode import get_scan_blocks_size
+
+
+CHUNK_LEN = 64 * 1024
+
+
+def find_restart_offsets(fp, position):
+    """ Scan entropy-coded data starting at position for RSTn markers,
+    returns file offsets of data of each restart interval
+    """
+    fp.seek(position)
+    offsets = [position]
+    base = position
+    data = b''
+    while True:
+        chunk = fp.read(CHUNK_LEN)
+        data += chunk
+        i = data.find(b'\xff')
+        while 0 <= i < len(data) - 1:
+            code = data[i + 1]
+            if 0xD0 <= code <= 0xD7:
+                offsets.append(base + i + 2)
+            elif code not in (0x00, 0xFF):
+                # end of the scan
+                return offsets
+            i = data.find(b'\xff', i + 2 if code != 0xFF else i + 1)
+        if not chunk:
+            return offsets
+        # keep 0xFF at the end, the next byte is in the next chunk
+        keep = 1 if data[-1:] == b'\xff' else 0
+        base += len(data) - keep
+        data = data[len(data) - keep:]
+
+class RestartIndex:
+    def __init__(self, restart_interval, mcus, offsets):
+        self.restart_interval = restart_interval
+        self.mcus = mcus
+        self.offsets = offsets
+
+    def get_interval(self, mcu):
+        """ Index of restart interval containing MCU """
+        return mcu // self.restart_interval
+
+    def get_range(self, interval):
+        """ MCUs of restart interval, as (start, end) """
+        start = interval * self.restart_interval
+        return start, min(start + self.restart_interval, self.mcus)
+
+    def to_dict(self):
+        return {
+            'restart_interval': self.restart_interval,
+            'mcus': self.mcus,
+            'offsets': self.offsets,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['restart_interval'], data['mcus'], data['offsets'])
+
+def build_restart_index(fp, scan):
+    """ Index restart intervals of sequential scan, frame should be prepared
+    """
+    restart_interval = scan.frame.restart_interval
+    if not restart_interval:
+        raise ValueError('image has no restart intervals')
+    blocks_x, blocks_y = get_scan_blocks_size(scan)
+    mcus = blocks_x * blocks_y
+    offsets = find_restart_offsets(fp, scan.position)
+    expected = (mcus + restart_interval - 1) // restart_interval
+    if len(offsets) != expected:
+        raise SyntaxError('found {} restart intervals, expected {}'.format(
+            len(offsets), expected))
+    return RestartIndex(restart_interval, mcus, offsets)
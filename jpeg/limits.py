@@ -0,0 +1,79 @@
+""" Decoding limits: image size, memory and number of scans are checked
+right after headers are parsed, time budget and cancellation between MCU
+rows and blocks.
+"""
+import sys
+import math
+import time
+from array import array
+
+
+class DecodeAborted(Exception):
+    def __init__(self, msg):
+        super().__init__(msg)
+        self.msg = msg
+
+class LimitExceeded(DecodeAborted):
+    pass
+
+class DeadlineExceeded(DecodeAborted):
+    def __init__(self):
+        super().__init__('decoding time budget is exceeded')
+
+class DecodeCancelled(DecodeAborted):
+    def __init__(self):
+        super().__init__('decoding is cancelled')
+
+
+# memory of a block, as allocated by Component.prepare: list item, array
+# of coefficients and 64 samples of 16 bits
+BLOCK_BYTES = 8 + sys.getsizeof(array('h', bytes(128))) + 128
+
+def get_memory_estimate(frame):
+    """ Bytes of coefficients and samples allocated for decoding """
+    blocks_x = math.ceil(frame.w / (8 * frame.max_h))
+    blocks_y = math.ceil(frame.h / (8 * frame.max_v))
+    n_blocks = sum(blocks_x * h * blocks_y * v for h, v in (c.sampling for c in frame.components))
+    return n_blocks * BLOCK_BYTES
+
+
+class Limits:
+    """ Limits of decoded image, None is unlimited """
+
+    def __init__(self, max_pixels=None, max_memory=None, max_scans=None):
+        self.max_pixels = max_pixels
+        self.max_memory = max_memory
+        self.max_scans = max_scans
+
+    def check_frame(self, frame):
+        pixels = frame.w * frame.h
+        if self.max_pixels is not None and pixels > self.max_pixels:
+            raise LimitExceeded('image has {} pixels, limit is {}'.format(
+                pixels, self.max_pixels))
+        memory = get_memory_estimate(frame)
+        if self.max_memory is not None and memory > self.max_memory:
+            raise LimitExceeded('decoding needs {} bytes, limit is {}'.format(
+                memory, self.max_memory))
+
+    def check_scans(self, n_scans):
+        if self.max_scans is not None and n_scans > self.max_scans:
+            raise LimitExceeded('image has more than {} scans'.format(self.max_scans))
+
+
+class CancelToken:
+    """ Cooperative cancellation with optional time budget in seconds,
+    check is passed to JpegImage.decode
+    """
+
+    def __init__(self, timeout=None):
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check(self):
+        if self.cancelled:
+            raise DecodeCancelled()
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise DeadlineExceeded()
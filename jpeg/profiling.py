@@ -0,0 +1,94 @@
+""" Profiling of decoding: cProfile of the whole run, written as pstats
+file, and tracemalloc allocations of each stage (parse, entropy decoding,
+finishing), taken from snapshots at decoding events.
+"""
+import io
+import pstats
+import cProfile
+import tracemalloc
+
+from .events import Observer
+
+
+PROFILE_PATH = 'decode.pstats'
+TOP = 10
+
+
+class AllocationTracker(Observer):
+    """ Takes tracemalloc snapshot at the end of each stage, events are
+    passed to the wrapped observer
+    """
+
+    def __init__(self, observer=None):
+        self.observer = observer
+        self.snapshots = []
+
+    def __call__(self, event, **info):
+        if self.observer:
+            self.observer(event, **info)
+        super().__call__(event, **info)
+
+    def mark(self, stage):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+        self.snapshots.append((stage, snapshot))
+
+    def on_parse_start(self):
+        self.mark('start')
+
+    def on_parse_end(self, elapsed): # pylint: disable=unused-argument
+        self.mark('parse')
+
+    def on_finish_start(self, component): # pylint: disable=unused-argument
+        if self.snapshots[-1][0] != 'entropy':
+            self.mark('entropy')
+
+    def get_top(self, top=TOP):
+        """ (stage, top allocation differences by line) of every stage """
+        result = []
+        for (_, old), (stage, new) in zip(self.snapshots, self.snapshots[1:]):
+            stats = new.compare_to(old, 'lineno')
+            result.append((stage, stats[:top]))
+        return result
+
+
+def format_report(profiler, tracker, path, top=TOP):
+    out = io.StringIO()
+    out.write('Profile written to {}\n'.format(path))
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats('cumulative').print_stats(top)
+    for stage, lines in tracker.get_top(top):
+        out.write('Allocations of {} stage:\n'.format(stage))
+        for stat in lines:
+            frame = stat.traceback[0]
+            out.write('  {:+10.1f} KB {:+8d} blocks  {}:{}\n'.format(
+                stat.size_diff / 1024, stat.count_diff, frame.filename, frame.lineno))
+    return out.getvalue()
+
+def run_profiled(img, fn, path=PROFILE_PATH, top=TOP):
+    """ Run fn decoding img with cProfile and tracemalloc, pstats are
+    written to path, returns text report
+    """
+    tracker = AllocationTracker(img.observer)
+    img.observer = tracker
+    profiler = cProfile.Profile()
+    # tracing started by caller is left running
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        profiler.enable()
+        try:
+            fn()
+        finally:
+            profiler.disable()
+        if tracker.snapshots:
+            tracker.mark('finish')
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+        img.observer = tracker.observer
+    profiler.dump_stats(path)
+    return format_report(profiler, tracker, path, top)
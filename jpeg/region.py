@@ -0,0 +1,179 @@
+""" Decoding of a rectangular region of the image. Only MCUs covering the
+region are kept, dequantized and transformed
+"""
+import math
+
+from .scan_decode import BitReader, read_baseline, finish_blocks, set_block
+from .utils import make_array
+
+
+class Window:
+    """ Blocks of each component covering MCU-aligned rectangle """
+    def __init__(self, frame, x, y, w, h):
+        if w <= 0 or h <= 0 or x < 0 or y < 0 or x + w > frame.w or y + h > frame.h:
+            raise ValueError('region is out of image bounds')
+        self.frame = frame
+        self.box = (x, y, w, h)
+
+        mcu_w = 8 * frame.max_h
+        mcu_h = 8 * frame.max_v
+        self.mcu_x = (x // mcu_w, math.ceil((x + w) / mcu_w))
+        self.mcu_y = (y // mcu_h, math.ceil((y + h) / mcu_h))
+
+        self.blocks = {}
+        for comp in frame.components:
+            width, height = self.get_blocks_size(comp)
+            self.blocks[comp.id] = [make_array('h', 64) for _ in range(width * height)]
+
+    def get_blocks_size(self, comp):
+        h, v = comp.sampling
+        x0, x1 = self.mcu_x
+        y0, y1 = self.mcu_y
+        return (x1 - x0) * h, (y1 - y0) * v
+
+    def get_block(self, comp, row, col):
+        """ Window block of component block at (row, col), or None if
+        the block is out of the window
+        """
+        h, v = comp.sampling
+        row -= self.mcu_y[0] * v
+        col -= self.mcu_x[0] * h
+        width, height = self.get_blocks_size(comp)
+        if 0 <= row < height and 0 <= col < width:
+            return self.blocks[comp.id][row * width + col]
+        return None
+
+    def copy_blocks(self, frame):
+        """ Take blocks from entropy-decoded frame """
+        for comp in frame.components:
+            width, _ = comp.blocks_size
+            blocks = self.blocks[comp.id]
+            w, h = self.get_blocks_size(comp)
+            h0 = self.mcu_y[0] * comp.sampling[1]
+            w0 = self.mcu_x[0] * comp.sampling[0]
+            for row in range(h):
+                for col in range(w):
+                    src = comp.blocks[(h0 + row) * width + w0 + col]
+                    blocks[row * w + col][:] = src
+
+    def finish(self):
+        """ Dequantize and IDCT window blocks, returns pixels of each
+        component in the window, row-major with blocks width stride
+        """
+        data = {}
+        for comp in self.frame.components:
+            w, h = self.get_blocks_size(comp)
+            qt = self.frame.quantization[comp.qc]
+            blocks = finish_blocks(self.blocks[comp.id], qt)
+            pixels = data[comp.id] = make_array('h', w * 8 * h * 8)
+            for i, block in enumerate(blocks):
+                row, col = divmod(i, w)
+                set_block(pixels, block, row * 8, col * 8, w * 8)
+        return data
+
+    def get_linearized_data(self):
+        """ Pixels of the region, in the same layout as
+        JpegImage.get_linearized_data gives
+        """
+        data = self.finish()
+        x, y, w, h = self.box
+        components = self.frame.components
+        n = len(components)
+
+        r = make_array('B', w * h * n)
+        for idx, c in enumerate(components):
+            scalex, scaley = c.scale
+            width = self.get_blocks_size(c)[0] * 8
+            x0 = self.mcu_x[0] * c.sampling[0] * 8
+            y0 = self.mcu_y[0] * c.sampling[1] * 8
+            pixels = data[c.id]
+            for row in range(h):
+                offset = ((y + row) // scaley - y0) * width - x0
+                coord = row * w * n + idx
+                for col in range(w):
+                    r[coord + col * n] = pixels[offset + (x + col) // scalex]
+        return r
+
+def reset_scan(scan):
+    for component in scan.components:
+        component.last_dc = 0
+    for huff_decoder in scan.huffman_dc.values():
+        if huff_decoder:
+            huff_decoder.reset()
+    for huff_decoder in scan.huffman_ac.values():
+        if huff_decoder:
+            huff_decoder.reset()
+
+def decode_mcus(fp, scan, window, position, start, end):
+    """ Decode MCUs [start, end) of sequential scan from position, which is
+    the beginning of a restart interval, blocks out of window are skipped
+    """
+    frame = scan.frame
+    fp.seek(position)
+    reader = BitReader(fp)
+    reset_scan(scan)
+    restart_interval = frame.restart_interval
+    scratch = make_array('h', 64)
+
+    if scan.is_interleaved:
+        blocks_x, _ = frame.blocks_size
+    else:
+        blocks_x, _ = scan.components[0].effective_blocks_size
+
+    for n in range(start, end):
+        if restart_interval and n > start and n % restart_interval == 0:
+            byte1 = reader.read_byte()
+            byte2 = reader.read_byte()
+            if byte1 != 0xFF or not 0xD0 <= byte2 <= 0xD7:
+                raise SyntaxError('restart marker not found')
+            reader.reset()
+            reset_scan(scan)
+
+        row, col = divmod(n, blocks_x)
+        if not scan.is_interleaved:
+            component = scan.components[0]
+            block = window.get_block(component, row, col)
+            read_baseline(reader, component, block or scratch, scan)
+            continue
+        for component in scan.components:
+            h, v = component.sampling
+            for i in range(v):
+                for j in range(h):
+                    block = window.get_block(component, row * v + i, col * h + j)
+                    read_baseline(reader, component, block or scratch, scan)
+
+def get_needed_ranges(scan, window):
+    """ Ranges of MCUs of the scan covering the window, (start, end) for
+    each MCU row
+    """
+    if scan.is_interleaved:
+        blocks_x, _ = scan.frame.blocks_size
+        x0, x1 = window.mcu_x
+        y0, y1 = window.mcu_y
+    else:
+        # MCU of non-interleaved scan is a single block
+        component = scan.components[0]
+        blocks_x, blocks_y = component.effective_blocks_size
+        h, v = component.sampling
+        x0, x1 = window.mcu_x[0] * h, min(window.mcu_x[1] * h, blocks_x)
+        y0, y1 = window.mcu_y[0] * v, min(window.mcu_y[1] * v, blocks_y)
+    return [(row * blocks_x + x0, row * blocks_x + x1) for row in range(y0, y1)]
+
+def decode_region_indexed(fp, scan, window, index):
+    """ Decode only restart intervals which contain MCUs of the window """
+    needed = {}
+    for start, end in get_needed_ranges(scan, window):
+        for interval in range(index.get_interval(start), index.get_interval(end - 1) + 1):
+            last = min(end, index.get_range(interval)[1])
+            needed[interval] = max(needed.get(interval, 0), last)
+
+    for interval, last in sorted(needed.items()):
+        start, _ = index.get_range(interval)
+        decode_mcus(fp, scan, window, index.offsets[interval], start, last)
+
+def decode_region_sequential(fp, scan, window):
+    """ Decode sequential scan up to the last MCU of the window, the rest
+    of the scan is not read
+    """
+    _, last = get_needed_ranges(scan, window)[-1]
+    decode_mcus(fp, scan, window, scan.position, 0, last)
@@ -1,6 +1,6 @@
 from io import BytesIO
 from array import array
-from itertools import product
+from itertools import chain
 from .zigzag import dezigzag
 from .idct import idct_2d
 from .utils import high_low4
@@ -40,7 +40,7 @@ class BitReader:
         self.chunk_len = len(self.chunk)
 
     def read_byte(self):
-        if self.chunk_it >= CHUNK_LEN:
+        if self.chunk_it >= self.chunk_len:
             self._next_chunk()
         if self.chunk_it >= self.chunk_len:
             raise StopIteration
@@ -116,106 +116,6 @@ def read_huffman(reader, decoder):
             return ch
     return None
 
-def read_ac_prog_first(reader, decoder, block_data, scan, component):
-    if not scan.prog_state:
-        scan.prog_state = ProgState()
-    state = scan.prog_state
-
-    if state.eobrun > 0:
-        # G.1.2.2 - this AC block contains all zeros
-        state.eobrun -= 1
-        return
-    k = scan.spectral_start
-    while k <= scan.spectral_end:
-        rs = read_huffman(reader, decoder)
-        r, s = high_low4(rs)
-        if s == 0:
-            if r < 15:
-                # G.1.2.2 - End-of-Bands
-                # the rest of this block contains all zeros
-                # and EOBRUN next blocks are all zeros too
-                state.eobrun = receive_and_extend_pos(reader, r)
-                state.eobrun -= 1
-                break
-            k += 15
-        else:
-            k += r
-            assert k <= scan.spectral_end
-            value = receive_and_extend(reader, s)
-            value = value << scan.approx_low
-            z = dezigzag[k]
-            block_data[z] = value
-        k += 1
-
-def read_ac_prog_refine(reader, decoder, block_data, scan, component):
-    if not scan.prog_state:
-        scan.prog_state = ProgState()
-    state = scan.prog_state
-
-    assert state.ac_state in (0, 4)
-    k = scan.spectral_start
-    e = scan.spectral_end
-    r = 0
-    while k <= e:
-        z = dezigzag[k]
-        sign = -1 if block_data[z] < 0 else 1
-        # if AC has non-zero history, then we will refine its value
-        has_prev_value = block_data[z] != 0
-
-        if state.ac_state == 0:
-            # initial state, we read encoded RRRRSSSS Huffman value
-            # R is the number of zero values before current value
-            # S is the amplitude of refine (should be 1)
-            rs = read_huffman(reader, decoder)
-            r, s = high_low4(rs)
-            if s == 0:
-                if r < 15:
-                    # EOB, we should skip all next zero values and
-                    # refine non-zero values till the end of block
-                    # For the next EOBRUN-1 blocks we do the same
-                    state.eobrun = receive_and_extend_pos(reader, r)
-                    state.ac_state = 4
-                else:
-                    # We skip next 16 zero values and refine all
-                    # non-zero values between them
-                    r = 16
-                    state.ac_state = 1
-            elif s == 1:
-                # We skip next R zero values and refine non-zero
-                # values between them, after that we set current
-                # value to ac_next_value
-                state.ac_next_value = receive_and_extend(reader, s)
-                state.ac_state = 2 if r else 3
-            else:
-                raise SyntaxError('invalid s value')
-
-        if state.ac_state == 1 or state.ac_state == 2:
-            if has_prev_value:
-                value = next(reader) << scan.approx_low
-                block_data[z] += sign * value
-            else:
-                r -= 1
-                if r == 0:
-                    state.ac_state = 3 if state.ac_state == 2 else 0
-
-        elif state.ac_state == 3:
-            if has_prev_value:
-                value = next(reader) << scan.approx_low
-                block_data[z] += sign * value
-            else:
-                block_data[z] = state.ac_next_value << scan.approx_low
-                state.ac_state = 0
-
-        elif state.ac_state == 4:
-            if has_prev_value:
-                value = next(reader) << scan.approx_low
-                block_data[z] += sign * value
-        k += 1
-    if state.ac_state == 4:
-        state.eobrun -= 1
-        if state.eobrun == 0:
-            state.ac_state = 0
-
 def read_baseline(reader, component, block_data, scan):
     dc_decoder = scan.huffman_dc[component.id]
 
@@ -242,44 +142,6 @@ def read_baseline(reader, component, block_data, scan):
             block_data[z] = ac
         k += 1
 
-def read_progressive(reader, component, block_data, scan):
-    # progressive scan contains either AC or DC values
-    # DC might be interleaved, AC is only non-interleaved
-    if not scan.is_refine:
-        if scan.is_dc:
-            read_fn = read_dc_prog_first
-        else:
-            read_fn = read_ac_prog_first
-    else:
-        if scan.is_dc:
-            read_fn = read_dc_prog_refine
-        else:
-            read_fn = read_ac_prog_refine
-    if scan.is_dc:
-        decoder = scan.huffman_dc[component.id]
-    else:
-        decoder = scan.huffman_ac[component.id]
-    read_fn(reader, decoder, block_data, scan, component)
-
-def read_dc_prog_first(reader, decoder, block_data, scan, component):
-    s = read_huffman(reader, decoder)
-    dc = receive_and_extend(reader, s)
-
-    dc += component.last_dc
-    component.last_dc = dc
-    block_data[0] = dc << scan.approx_low
-
-def read_dc_prog_refine(reader, decoder, block_data, scan, component):
-    bit = next(reader)
-    value = bit << scan.approx_low
-    block_data[0] |= value
-
-class ProgState:
-    def __init__(self):
-        self.eobrun = 0
-        self.ac_state = 0
-        self.ac_next_value = None
-
 def set_block(data, block_data, row, col, width):
     offset = row * width + col
     for i in range(8):
@@ -298,56 +160,283 @@ def iter_block_samples(component, row, col):
             sub_col = col * h + j
             yield blocks[sub_row * w + sub_col]
 
-def decode(fp, scan):
-    reader = BitReader(fp)
-    frame = scan.frame
-    components = scan.components
-    restart_interval = frame.restart_interval
-    non_interleaved = not scan.is_interleaved
+def make_baseline_decoder(reader, scan, component):
+    """ read_baseline with decoders, helpers and DC prediction bound to the
+    closure, Huffman symbols are read inline
+    """
+    dc_decoder = scan.huffman_dc[component.id]
+    ac_decoder = scan.huffman_ac[component.id]
+    extend = receive_and_extend
+    zz = dezigzag
+    pred = 0
+
+    def decode_block(block_data):
+        nonlocal pred
+        s = None
+        for bit in reader:
+            s = dc_decoder(bit)
+            if s is not None:
+                break
+        pred += extend(reader, s)
+        block_data[0] = pred
+
+        k = 1
+        while k <= 63:
+            rs = None
+            for bit in reader:
+                rs = ac_decoder(bit)
+                if rs is not None:
+                    break
+            r = rs >> 4
+            s = rs & 15
+            if s == 0:
+                if r < 15:
+                    break
+                k += 15
+            else:
+                k += r
+                block_data[zz[k]] = extend(reader, s)
+            k += 1
+
+    def reset():
+        nonlocal pred
+        pred = 0
+    return decode_block, reset
+
+def make_dc_first_decoder(reader, scan, component):
+    decoder = scan.huffman_dc[component.id]
+    extend = receive_and_extend
+    shift = scan.approx_low
+    pred = 0
+
+    def decode_block(block_data):
+        nonlocal pred
+        s = None
+        for bit in reader:
+            s = decoder(bit)
+            if s is not None:
+                break
+        pred += extend(reader, s)
+        block_data[0] = pred << shift
+
+    def reset():
+        nonlocal pred
+        pred = 0
+    return decode_block, reset
+
+def make_dc_refine_decoder(reader, scan, component): # pylint: disable=unused-argument
+    bit_value = 1 << scan.approx_low
+
+    def decode_block(block_data):
+        if next(reader):
+            block_data[0] |= bit_value
+    return decode_block, None
+
+def make_ac_first_decoder(reader, scan, component):
+    decoder = scan.huffman_ac[component.id]
+    start = scan.spectral_start
+    end = scan.spectral_end
+    shift = scan.approx_low
+    extend = receive_and_extend
+    zz = dezigzag
+    eob_runs = scan.eob_runs
+    eobrun = 0
+
+    def decode_block(block_data):
+        nonlocal eobrun
+        if eobrun:
+            # G.1.2.2 - this AC block contains all zeros
+            eobrun -= 1
+            return
+        k = start
+        while k <= end:
+            rs = None
+            for bit in reader:
+                rs = decoder(bit)
+                if rs is not None:
+                    break
+            r = rs >> 4
+            s = rs & 15
+            if s == 0:
+                if r < 15:
+                    # G.1.2.2 - End-of-Bands
+                    # the rest of this block contains all zeros
+                    # and EOBRUN next blocks are all zeros too
+                    eobrun = receive_and_extend_pos(reader, r)
+                    if eob_runs is not None:
+                        eob_runs[eobrun] += 1
+                    eobrun -= 1
+                    break
+                k += 15
+            else:
+                k += r
+                assert k <= end
+                block_data[zz[k]] = extend(reader, s) << shift
+            k += 1
+
+    def reset():
+        nonlocal eobrun
+        eobrun = 0
+    return decode_block, reset
+
+def make_ac_refine_decoder(reader, scan, component):
+    decoder = scan.huffman_ac[component.id]
+    start = scan.spectral_start
+    end = scan.spectral_end
+    shift = scan.approx_low
+    bit_value = 1 << shift
+    extend = receive_and_extend
+    zz = dezigzag
+    eob_runs = scan.eob_runs
+    eobrun = 0
+
+    def decode_block(block_data):
+        # state 0: RRRRSSSS Huffman value is read next
+        # state 1: skip r zero values, refine non-zero ones between them
+        # state 2: as 1, and then set the next zero value to next_value
+        # state 3: set the next zero value to next_value
+        # state 4: EOB run, refine non-zero values till the end of block
+        nonlocal eobrun
+        state = 4 if eobrun else 0
+        r = 0
+        next_value = 0
+        k = start
+        while k <= end:
+            z = zz[k]
+            value = block_data[z]
+            if state == 0:
+                rs = None
+                for bit in reader:
+                    rs = decoder(bit)
+                    if rs is not None:
+                        break
+                r = rs >> 4
+                s = rs & 15
+                if s == 0:
+                    if r < 15:
+                        eobrun = receive_and_extend_pos(reader, r)
+                        if eob_runs is not None:
+                            eob_runs[eobrun] += 1
+                        state = 4
+                    else:
+                        r = 16
+                        state = 1
+                elif s == 1:
+                    next_value = extend(reader, s) << shift
+                    state = 2 if r else 3
+                else:
+                    raise SyntaxError('invalid s value')
 
-    if frame.progressive:
-        decode_fn = lambda c, b: read_progressive(reader, c, b, scan)
+            if value:
+                # non-zero history, its value is refined in any state
+                if next(reader):
+                    block_data[z] = value + bit_value if value > 0 else value - bit_value
+            elif state == 1 or state == 2:
+                r -= 1
+                if r == 0:
+                    state = 3 if state == 2 else 0
+            elif state == 3:
+                block_data[z] = next_value
+                state = 0
+            k += 1
+        if state == 4:
+            eobrun -= 1
+
+    def reset():
+        nonlocal eobrun
+        eobrun = 0
+    return decode_block, reset
+
+def make_block_decoder(reader, scan, component):
+    """ Decoder of one block of component in scan, and its reset function
+    for restart markers or None. Decoders are specialized once per scan:
+    Huffman decoders, spectral range, approximation shift, dezigzag table
+    and DC prediction or EOB run are bound to the closure
+    """
+    if not scan.frame.progressive:
+        return make_baseline_decoder(reader, scan, component)
+    if scan.is_dc:
+        make_fn = make_dc_refine_decoder if scan.is_refine else make_dc_first_decoder
     else:
-        decode_fn = lambda c, b: read_baseline(reader, c, b, scan)
+        make_fn = make_ac_refine_decoder if scan.is_refine else make_ac_first_decoder
+    return make_fn(reader, scan, component)
+
+def get_mcu_units(reader, scan):
+    """ For each component of scan: block decoder, blocks, step of block
+    index per MCU row and column, and block offsets inside of MCU. And
+    reset functions of decoders
+    """
+    units = []
+    resets = []
+    for component in scan.components:
+        decode_fn, reset = make_block_decoder(reader, scan, component)
+        if reset:
+            resets.append(reset)
+        if not scan.is_interleaved:
+            stride, _ = component.blocks_size
+            units.append((decode_fn, component.blocks, stride, 1, (0,)))
+            continue
+        h, v = component.sampling
+        w, _ = component.blocks_size
+        offsets = tuple(i * w + j for i in range(v) for j in range(h))
+        units.append((decode_fn, component.blocks, w * v, h, offsets))
+    return units, resets
+
+def iter_decode_mcus(reader, scan):
+    """ Decode scan from BitReader, yields (row, col) of each decoded MCU
+    """
+    restart_interval = scan.frame.restart_interval
+    blocks_x, blocks_y = get_scan_blocks_size(scan)
+    n_mcus = blocks_x * blocks_y
+    units, resets = get_mcu_units(reader, scan)
+    huff_decoders = [d for d in chain(scan.huffman_dc.values(), scan.huffman_ac.values()) if d]
 
     n = 0
     restart = 0
-
-    if non_interleaved:
-        component = components[0]
-        blocks_x, blocks_y = component.blocks_size
-    else:
-        blocks_x, blocks_y = frame.blocks_size
-
-    for block_row, block_col in product(range(blocks_y), range(blocks_x)):
-        if non_interleaved:
-            component = components[0]
-            block = component.blocks[block_row * blocks_x + block_col]
-            decode_fn(component, block)
-        else:
-            # interleaved
-            for component in components:
-                for block in iter_block_samples(component, block_row, block_col):
-                    decode_fn(component, block)
-        if restart_interval:
-            n += 1
-            if n < blocks_x * blocks_y and n % restart_interval == 0:
-                byte1 = reader.read_byte()
-                byte2 = reader.read_byte()
-                assert byte1 == 0xFF, '0x{0:X}'.format(byte1)
-                assert 0xD0 <= byte2 <= 0xD7, '0xFF{0:X}'.format(byte2)
-                assert byte2 == 0xD0 + restart
-                restart = (restart + 1) % 8
-                reader.reset()
-                for component in components:
-                    component.last_dc = 0
-                for huff_decoder in scan.huffman_dc.values():
-                    if huff_decoder:
-                        huff_decoder.reset()
-                for huff_decoder in scan.huffman_ac.values():
-                    if huff_decoder:
+    for block_row in range(blocks_y):
+        for block_col in range(blocks_x):
+            for decode_fn, blocks, row_step, col_step, offsets in units:
+                base = block_row * row_step + block_col * col_step
+                for offset in offsets:
+                    decode_fn(blocks[base + offset])
+            if restart_interval:
+                n += 1
+                if n < n_mcus and n % restart_interval == 0:
+                    byte1 = reader.read_byte()
+                    byte2 = reader.read_byte()
+                    assert byte1 == 0xFF, '0x{0:X}'.format(byte1)
+                    assert 0xD0 <= byte2 <= 0xD7, '0xFF{0:X}'.format(byte2)
+                    assert byte2 == 0xD0 + restart
+                    restart = (restart + 1) % 8
+                    reader.reset()
+                    for reset in resets:
+                        reset()
+                    for huff_decoder in huff_decoders:
                         huff_decoder.reset()
-                scan.prog_state = None
+            yield block_row, block_col
+
+def get_scan_blocks_size(scan):
+    """ Number of MCUs of scan in a row and in a column """
+    if scan.is_interleaved:
+        return scan.frame.blocks_size
+    return scan.components[0].effective_blocks_size
+
+def get_scan_blocks(scan):
+    """ Number of blocks decoded in scan """
+    blocks_x, blocks_y = get_scan_blocks_size(scan)
+    if not scan.is_interleaved:
+        return blocks_x * blocks_y
+    return blocks_x * blocks_y * sum(h * v for h, v in (c.sampling for c in scan.components))
+
+def iter_decode(fp, scan, reader=None):
+    """ Decode scan, yields index of each decoded MCU row
+    """
+    blocks_x, _ = get_scan_blocks_size(scan)
+    if reader is None:
+        reader = BitReader(fp)
+    for block_row, block_col in iter_decode_mcus(reader, scan):
+        if block_col == blocks_x - 1:
+            yield block_row
 
 def clamp(x):
     if x < -128:
@@ -363,14 +452,69 @@ def decode_prog_block_finish(component, block_data, qt):
     for c in range(64):
         block_data[c] = clamp(block_data[c])
 
-def decode_finish(frame):
-    for comp in frame.components:
-        data = comp.data
-        blocks = comp.blocks
-        w, h = comp.blocks_size
-        qt = frame.quantization[comp.qc]
-        for row in range(h):
-            for col in range(w):
-                block = blocks[row * w + col]
-                decode_prog_block_finish(comp, block, qt)
-                set_block(data, block, row * 8, col * 8, w * 8)
+def finish_blocks(blocks, qt, check=None):
+    """ Dequantize, IDCT and clamp list of blocks
+    Doesn't depend on component state, so it could be run in a worker
+    process, blocks are returned back
+    """
+    for block in blocks:
+        if check:
+            check()
+        decode_prog_block_finish(None, block, qt)
+    return blocks
+
+def set_block_rows(comp, blocks, row_start):
+    """ Put finished blocks of rows starting from row_start to component
+    pixels data
+    """
+    data = comp.data
+    w, _ = comp.blocks_size
+    offset = row_start * w
+    for i, block in enumerate(blocks):
+        row, col = divmod(i, w)
+        comp.blocks[offset + i] = block
+        set_block(data, block, (row_start + row) * 8, col * 8, w * 8)
+
+def get_block_rows(comp, row_start, row_end):
+    w, _ = comp.blocks_size
+    return comp.blocks[row_start * w:row_end * w]
+
+def decode_component_finish(frame, comp, check=None):
+    _, h = comp.blocks_size
+    qt = frame.quantization[comp.qc]
+    blocks = finish_blocks(get_block_rows(comp, 0, h), qt, check)
+    set_block_rows(comp, blocks, 0)
+
+def decode_pipelined(fp, scan, executor, check=None):
+    """ Decode sequential scan and finish MCU rows in executor as soon
+    as they are entropy-decoded. Rows not started yet are cancelled if
+    decoding fails or check aborts it
+    """
+    frame = scan.frame
+    non_interleaved = not scan.is_interleaved
+    _, last_row = get_scan_blocks_size(scan)
+    pending = []
+
+    try:
+        for mcu_row in iter_decode(fp, scan):
+            if check:
+                check()
+            for comp in scan.components:
+                _, h = comp.blocks_size
+                v = 1 if non_interleaved else comp.sampling[1]
+                row_start = mcu_row * v
+                # padding rows are finished together with the last row
+                row_end = h if mcu_row == last_row - 1 else row_start + v
+                qt = frame.quantization[comp.qc]
+                blocks = get_block_rows(comp, row_start, row_end)
+                future = executor.submit(finish_blocks, blocks, qt)
+                pending.append((comp, row_start, future))
+
+        for comp, row_start, future in pending:
+            if check:
+                check()
+            set_block_rows(comp, future.result(), row_start)
+    except BaseException:
+        for _, _, future in pending:
+            future.cancel()
+        raise
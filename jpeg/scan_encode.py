@@ -0,0 +1,277 @@
+from collections import defaultdict
+from itertools import product
+from .zigzag import dezigzag
+from .huffman.utils import bits_to_byte
+from .scan_decode import iter_block_samples, bmask
+
+CHUNK_LEN = 10 * 1024
+
+class BitWriter:
+    def __init__(self, data):
+        self.data = data
+        self.chunk = bytearray()
+        self.bits = 0
+        self.bit_counter = 0
+
+    def write(self, value, length):
+        self.bits = (self.bits << length) | value
+        self.bit_counter += length
+        if self.bit_counter < 8:
+            return
+        chunk = self.chunk
+        while self.bit_counter >= 8:
+            self.bit_counter -= 8
+            byte = (self.bits >> self.bit_counter) & 0xFF
+            chunk.append(byte)
+            if byte == 0xFF:
+                # byte stuffing, 0xFF00 is not a marker
+                chunk.append(0x00)
+        self.bits &= bmask[self.bit_counter]
+        if len(chunk) >= CHUNK_LEN:
+            self._flush_chunk()
+
+    def align(self):
+        """ Pad the last byte with 1-bits """
+        if self.bit_counter:
+            pad = 8 - self.bit_counter
+            self.write(bmask[pad], pad)
+
+    def write_marker(self, code):
+        self.align()
+        self.chunk.append(0xFF)
+        self.chunk.append(code & 0xFF)
+
+    def _flush_chunk(self):
+        self.data.write(self.chunk)
+        self.chunk = bytearray()
+
+    def flush(self):
+        self.align()
+        self._flush_chunk()
+
+def get_code_table(codes):
+    """ Convert Huffman codes, dictionary symbol -> (1, 0, 1) tuple,
+    to list of (code, length) indexed by symbol
+    """
+    table = [None] * 256
+    for ch, bits in codes.items():
+        table[ch] = (bits_to_byte(bits), len(bits))
+    return table
+
+class SymbolCounter:
+    """ Stands for code table in the first pass of optimized encoding,
+    counts frequences of symbols which are written
+    """
+    def __init__(self):
+        self.freq = defaultdict(int)
+
+    def __getitem__(self, symbol):
+        self.freq[symbol] += 1
+        return (0, 0)
+
+def get_category(value):
+    """ Number of bits of the magnitude, SSSS in F.1.2.1 """
+    return abs(value).bit_length()
+
+def get_extra_bits(value, s):
+    """ The inverse of ext_table """
+    if value < 0:
+        return value + bmask[s]
+    return value
+
+def write_baseline(writer, component, block_data, scan):
+    write = writer.write
+    dc_table = scan.huffman_dc[component.id]
+
+    dc = block_data[0]
+    diff = dc - component.last_dc
+    component.last_dc = dc
+    s = get_category(diff)
+    write(*dc_table[s])
+    if s:
+        write(get_extra_bits(diff, s), s)
+
+    ac_table = scan.huffman_ac[component.id]
+    r = 0
+    for k in range(1, 64):
+        ac = block_data[dezigzag[k]]
+        if ac == 0:
+            r += 1
+            continue
+        while r > 15:
+            write(*ac_table[0xF0]) # ZRL - sixteen zeros
+            r -= 16
+        s = get_category(ac)
+        write(*ac_table[(r << 4) | s])
+        write(get_extra_bits(ac, s), s)
+        r = 0
+    if r:
+        write(*ac_table[0x00]) # EOB
+
+class ProgState:
+    def __init__(self):
+        self.eobrun = 0
+        # correction bits of refined blocks within EOB run
+        self.correction_bits = []
+
+def write_bits(writer, bits):
+    for bit in bits:
+        writer.write(bit, 1)
+
+def write_eobrun(writer, scan):
+    state = scan.prog_state
+    if not state or not state.eobrun:
+        return
+    ac_table = scan.huffman_ac[scan.components[0].id]
+    # G.1.2.2 - EOBn, n is the number of extra bits
+    n = state.eobrun.bit_length() - 1
+    writer.write(*ac_table[n << 4])
+    if n:
+        writer.write(state.eobrun & bmask[n], n)
+    state.eobrun = 0
+    write_bits(writer, state.correction_bits)
+    state.correction_bits = []
+
+def write_dc_prog_first(writer, component, block_data, scan):
+    dc = block_data[0] >> scan.approx_low
+    diff = dc - component.last_dc
+    component.last_dc = dc
+    s = get_category(diff)
+    writer.write(*scan.huffman_dc[component.id][s])
+    if s:
+        writer.write(get_extra_bits(diff, s), s)
+
+def write_dc_prog_refine(writer, component, block_data, scan):
+    writer.write((block_data[0] >> scan.approx_low) & 1, 1)
+
+def write_ac_prog_first(writer, component, block_data, scan):
+    if not scan.prog_state:
+        scan.prog_state = ProgState()
+    state = scan.prog_state
+
+    write = writer.write
+    ac_table = scan.huffman_ac[component.id]
+    al = scan.approx_low
+    r = 0
+    for k in range(scan.spectral_start, scan.spectral_end + 1):
+        value = block_data[dezigzag[k]]
+        # point transform of the magnitude
+        value = value >> al if value >= 0 else -(-value >> al)
+        if value == 0:
+            r += 1
+            continue
+        write_eobrun(writer, scan)
+        while r > 15:
+            write(*ac_table[0xF0])
+            r -= 16
+        s = get_category(value)
+        write(*ac_table[(r << 4) | s])
+        write(get_extra_bits(value, s), s)
+        r = 0
+    if r:
+        state.eobrun += 1
+        if state.eobrun == 0x7FFF:
+            write_eobrun(writer, scan)
+
+def write_ac_prog_refine(writer, component, block_data, scan):
+    if not scan.prog_state:
+        scan.prog_state = ProgState()
+    state = scan.prog_state
+
+    write = writer.write
+    ac_table = scan.huffman_ac[component.id]
+    al = scan.approx_low
+    spectral = range(scan.spectral_start, scan.spectral_end + 1)
+    values = [abs(block_data[dezigzag[k]]) >> al for k in spectral]
+
+    # position of the last newly non-zero value
+    eob = 0
+    for k in spectral:
+        if values[k - scan.spectral_start] == 1:
+            eob = k
+
+    r = 0
+    correction_bits = []
+    for k in spectral:
+        value = values[k - scan.spectral_start]
+        if value == 0:
+            r += 1
+            continue
+        # ZRL, unless zeros could be a part of EOB
+        while r > 15 and k <= eob:
+            write_eobrun(writer, scan)
+            write(*ac_table[0xF0])
+            r -= 16
+            write_bits(writer, correction_bits)
+            correction_bits = []
+        if value > 1:
+            # the value was non-zero, only next bit is sent
+            correction_bits.append(value & 1)
+            continue
+        write_eobrun(writer, scan)
+        write(*ac_table[(r << 4) | 1])
+        write(0 if block_data[dezigzag[k]] < 0 else 1, 1)
+        write_bits(writer, correction_bits)
+        correction_bits = []
+        r = 0
+    if r or correction_bits:
+        state.eobrun += 1
+        state.correction_bits.extend(correction_bits)
+        if state.eobrun == 0x7FFF:
+            write_eobrun(writer, scan)
+
+def get_progressive_fn(scan):
+    if not scan.is_refine:
+        if scan.is_dc:
+            return write_dc_prog_first
+        return write_ac_prog_first
+    if scan.is_dc:
+        return write_dc_prog_refine
+    return write_ac_prog_refine
+
+def iter_mcu(scan):
+    """ Iterate over MCUs of scan, for each MCU yields list of
+    (component, block) in the order they are coded
+    """
+    frame = scan.frame
+    components = scan.components
+
+    if not scan.is_interleaved:
+        component = components[0]
+        blocks_x, blocks_y = component.effective_blocks_size
+        stride, _ = component.blocks_size
+        for block_row, block_col in product(range(blocks_y), range(blocks_x)):
+            yield [(component, component.blocks[block_row * stride + block_col])]
+        return
+
+    blocks_x, blocks_y = frame.blocks_size
+    for block_row, block_col in product(range(blocks_y), range(blocks_x)):
+        yield [(component, block)
+               for component in components
+               for block in iter_block_samples(component, block_row, block_col)]
+
+def encode(fp, scan, encode_fn=write_baseline, flush_fn=None):
+    """ Encode scan, flush_fn is called at the end of restart interval
+    """
+    writer = BitWriter(fp)
+    restart_interval = scan.frame.restart_interval
+    components = scan.components
+
+    for component in components:
+        component.last_dc = 0
+
+    restart = 0
+    for n, mcu in enumerate(iter_mcu(scan)):
+        if restart_interval and n > 0 and n % restart_interval == 0:
+            if flush_fn:
+                flush_fn(writer, scan)
+            scan.prog_state = None
+            writer.write_marker(0xD0 + restart)
+            restart = (restart + 1) % 8
+            for component in components:
+                component.last_dc = 0
+        for component, block in mcu:
+            encode_fn(writer, component, block, scan)
+    if flush_fn:
+        flush_fn(writer, scan)
+    writer.flush()
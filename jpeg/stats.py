@@ -0,0 +1,112 @@
+""" Opt-in counters of entropy decoding: bits read, Huffman symbols and
+their code lengths, lengths of EOB runs of progressive scans, and blocks
+without AC coefficients. Counting versions of the bit reader and Huffman decoders are
+used only for images with stats enabled, so there is no cost otherwise.
+"""
+from collections import Counter
+
+from .scan_decode import BitReader
+
+
+class CountingBitReader(BitReader):
+    def __init__(self, data):
+        super().__init__(data)
+        self.bits = 0
+
+    def __next__(self):
+        self.bits += 1
+        return super().__next__()
+
+
+class CountingDecoder:
+    """ Wraps Huffman decoder, counts resolved symbols by code length """
+
+    def __init__(self, decoder, lengths, symbols):
+        self.decoder = decoder
+        self.lengths = lengths
+        self.symbols = symbols
+        self.bits = 0
+
+    def __call__(self, bit):
+        self.bits += 1
+        ch = self.decoder(bit)
+        if ch is not None:
+            self.lengths[self.bits] += 1
+            self.symbols[ch] += 1
+            self.bits = 0
+        return ch
+
+    def reset(self):
+        self.decoder.reset()
+        self.bits = 0
+
+
+class DecodeStats:
+    def __init__(self):
+        self.bits = 0
+        # per class ('dc', 'ac') and component id
+        self.lengths = {'dc': {}, 'ac': {}}
+        self.symbols = {'dc': {}, 'ac': {}}
+        self.eob_runs = Counter() # number of runs by length in blocks
+        self.blocks = 0
+        self.dc_only_blocks = 0
+        self.zero_blocks = 0
+        self.decoders = None
+        self.counting = None
+
+    def start_scan(self, scan):
+        """ Replace decoders of scan by counting ones, returns reader class
+        for the scan. EOBRUN lengths are counted by the decoder to
+        scan.eob_runs
+        """
+        self.decoders = (dict(scan.huffman_dc), dict(scan.huffman_ac))
+        self.counting = []
+        for kind, decoders in (('dc', scan.huffman_dc), ('ac', scan.huffman_ac)):
+            for idx, decoder in decoders.items():
+                if decoder is not None:
+                    counting = decoders[idx] = CountingDecoder(decoder, Counter(), Counter())
+                    self.counting.append((kind, idx, counting))
+        scan.eob_runs = self.eob_runs
+        return CountingBitReader
+
+    def end_scan(self, scan, reader):
+        """ Restore decoders of scan, it's called even if decoding failed """
+        scan.huffman_dc, scan.huffman_ac = self.decoders
+        scan.eob_runs = None
+        self.bits += reader.bits
+        for kind, idx, counting in self.counting:
+            self.lengths[kind].setdefault(idx, Counter()).update(counting.lengths)
+            self.symbols[kind].setdefault(idx, Counter()).update(counting.symbols)
+        self.decoders = self.counting = None
+
+    def count_blocks(self, frame):
+        """ Blocks padding components to whole MCUs are not counted, they
+        are not coded in non-interleaved scans
+        """
+        for comp in frame.components:
+            width = comp.blocks_size[0]
+            blocks_x, blocks_y = comp.effective_blocks_size
+            for row in range(blocks_y):
+                for block in comp.blocks[row * width:row * width + blocks_x]:
+                    self.count_block(block)
+
+    def count_block(self, block):
+        self.blocks += 1
+        if not any(block[1:]):
+            self.dc_only_blocks += 1
+            if not block[0]:
+                self.zero_blocks += 1
+
+    def to_dict(self):
+        symbols = lambda kind: {idx: sum(c.values()) for idx, c in self.symbols[kind].items()}
+        lengths = lambda kind: {idx: dict(sorted(c.items())) for idx, c in self.lengths[kind].items()}
+        return {
+            'bits': self.bits,
+            'symbols': {'dc': symbols('dc'), 'ac': symbols('ac')},
+            'code_lengths': {'dc': lengths('dc'), 'ac': lengths('ac')},
+            'eob_runs': dict(sorted(self.eob_runs.items())),
+            'eob_run_blocks': sum(n * count for n, count in self.eob_runs.items()),
+            'blocks': self.blocks,
+            'dc_only_blocks': self.dc_only_blocks,
+            'zero_blocks': self.zero_blocks,
+        }
@@ -0,0 +1,296 @@
+""" Push-style decoding: bytes are fed as they arrive, markers are parsed
+as soon as their segments are complete, and MCUs are entropy-decoded as
+soon as enough bytes of the scan are buffered.
+"""
+import time
+from io import BytesIO
+
+from . import sof_types
+from .core import (JpegImage, BadMarker, marker_map, marker_names, parsers,
+                   SOI, EOI, SOF, SOS, RST, DNL, DAC, DHP, EXP, JPG)
+from .scan_decode import BitReader, iter_decode_mcus, get_scan_blocks, get_scan_blocks_size
+
+
+# Upper bound of entropy-coded bytes of a single block: Huffman code and
+# extra bits of every coefficient, doubled for byte stuffing
+MAX_BLOCK_BYTES = 512
+
+# Size of reads from file
+CHUNK_LEN = 16 * 1024
+
+# Unused buffer prefix is dropped once it is this long
+TRIM_LEN = 64 * 1024
+
+
+class ScanSource:
+    """ File-like reader of scan data in decoder buffer, up to limit.
+    Reading past the limit, when the end of scan is known, is EOFError
+    """
+
+    def __init__(self, decoder, pos):
+        self.decoder = decoder
+        self.pos = pos
+        self.limit = pos
+
+    def read(self, n):
+        decoder = self.decoder
+        if self.pos >= self.limit and decoder.scan_end is not None:
+            raise EOFError('scan data ends inside of MCU')
+        end = min(self.pos + n, self.limit)
+        data = bytes(decoder.buffer[self.pos - decoder.base:end - decoder.base])
+        self.pos = end
+        return data
+
+
+def get_mcu_bytes(scan):
+    if scan.is_interleaved:
+        blocks = sum(h * v for h, v in (c.sampling for c in scan.components))
+    else:
+        blocks = 1
+    # and a restart marker
+    return blocks * MAX_BLOCK_BYTES + 2
+
+
+class StreamDecoder:
+    """ Incremental decoder, feed(chunk) as data arrives, close() at the
+    end of data returns the decoded JpegImage. check is called between
+    MCUs and blocks, as in JpegImage.decode
+    """
+
+    def __init__(self, limits=None, check=None, observer=None):
+        self.image = JpegImage(None, limits, observer)
+        self.check = check
+        self.buffer = bytearray()
+        self.base = 0 # stream offset of the first byte in buffer
+        self.pos = 0 # stream offset of the next marker
+        self.done = False
+
+        self.scan_mcus = None
+        self.source = None
+        self.reader = None
+        self.mcu_bytes = 0
+        self.scan_end = None
+        self.search_pos = 0
+        self.scan_time = 0.0
+        self.mcus = 0
+
+    def feed(self, chunk):
+        if self.done:
+            return
+        self.buffer += chunk
+        self.advance()
+
+    def close(self):
+        """ End of data, image is finished if the last scan is complete
+        but EOI is missing
+        """
+        if not self.done and self.scan_mcus is not None:
+            self.scan_end = self.base + len(self.buffer)
+            self.source.limit = self.scan_end
+            self.advance()
+        if not self.done:
+            img = self.image
+            if not (img.frame and img.frame.progressive and img.scans and self.scan_mcus is None):
+                raise EOFError
+            self.finish()
+        return self.image
+
+    def advance(self):
+        while not self.done:
+            if self.scan_mcus is not None:
+                if not self.decode_scan():
+                    break
+            elif not self.parse_marker():
+                break
+
+    def trim(self, pos):
+        if pos - self.base >= TRIM_LEN or self.scan_mcus is None:
+            del self.buffer[:pos - self.base]
+            self.base = pos
+
+    def parse_marker(self):
+        buf = self.buffer
+        i = self.pos - self.base
+        # fill bytes
+        while i + 1 < len(buf) and buf[i] == 0xFF and buf[i + 1] == 0xFF:
+            i += 1
+        if len(buf) - i < 2:
+            return False
+        if buf[i] != 0xFF:
+            raise BadMarker(buf[i])
+        code = 0xFF00 | buf[i + 1]
+        marker = marker_map.get(code)
+        if marker is None:
+            raise BadMarker(code)
+
+        end = i + 2
+        if marker not in (SOI, EOI, RST):
+            if len(buf) - i < 4:
+                return False
+            length = (buf[i + 2] << 8) | buf[i + 3]
+            end += length
+            if len(buf) < end:
+                return False
+
+        img = self.image
+        self.check_marker(code, marker)
+        img.marker_codes.append((code, marker, self.base + i + 2))
+        img.emit('marker', code=code, name=marker_names[marker], position=self.base + i + 2)
+        parser = parsers.get(marker)
+        if parser:
+            img.fp = BytesIO(buf[i + 2:end])
+            parser(img, code)
+        self.pos = self.base + end
+
+        if marker == SOF:
+            img.emit('frame', image=img)
+        elif marker == SOS:
+            self.check_tables(img.scans[-1])
+            self.start_scan(img.scans[-1])
+        elif marker == EOI:
+            self.finish()
+        self.trim(self.pos)
+        return True
+
+    def check_marker(self, code, marker):
+        markers = [m for _, m, _ in self.image.marker_codes]
+        if not markers and marker != SOI:
+            raise SyntaxError('SOI is not the first market')
+        if marker == SOI and markers:
+            raise SyntaxError('SOI found more than once')
+        if marker in (DAC, DHP, EXP, JPG):
+            name = marker_names[marker]
+            raise SyntaxError('Unsupported 0x{0:X} {1} marker'.format(code, name))
+        if marker == DNL:
+            raise SyntaxError('DNL is not supported in stream')
+        if marker == RST:
+            raise SyntaxError('RST outside of scan')
+        if marker == SOF:
+            if SOF in markers:
+                raise SyntaxError('SOF found more than once')
+            if code in sof_types.differential:
+                raise SyntaxError('Differential is not supported')
+            if code in sof_types.loseless:
+                raise SyntaxError('Loseless is not supported')
+            if code in sof_types.arithmetic:
+                raise SyntaxError('Arithmetic is not supported')
+        if marker == SOS:
+            if SOF not in markers:
+                raise SyntaxError('SOF should be before SOS')
+            if SOS in markers and not self.image.frame.progressive:
+                raise SyntaxError('Baseline should contain one SOS')
+        if marker == EOI and SOS not in markers:
+            raise SyntaxError('SOS not found')
+
+    def check_tables(self, scan):
+        """ Tables used by scan should be defined before it, seekable image
+        checks DHT and DQT in validate_markers
+        """
+        progressive = self.image.frame.progressive
+        needs_dc = scan.is_dc and not (progressive and scan.is_refine)
+        needs_ac = scan.is_ac or not progressive
+        for comp in scan.components:
+            if comp.qc not in self.image.quantization:
+                raise SyntaxError('DQT table {} is not defined'.format(comp.qc))
+            if needs_dc and scan.huffman_dc[comp.id] is None:
+                raise SyntaxError('DHT table is not defined for component {}'.format(comp.id))
+            if needs_ac and scan.huffman_ac[comp.id] is None:
+                raise SyntaxError('DHT table is not defined for component {}'.format(comp.id))
+
+    def start_scan(self, scan):
+        img = self.image
+        if len(img.scans) == 1:
+            img.frame.prepare()
+        scan.position = self.pos
+        self.scan_end = None
+        self.source = ScanSource(self, self.pos)
+        self.reader = BitReader(self.source)
+        self.scan_mcus = iter_decode_mcus(self.reader, scan)
+        self.mcu_bytes = get_mcu_bytes(scan)
+        self.search_pos = self.pos
+        self.scan_time = 0.0
+        img.emit('scan_start', index=len(img.scans) - 1, scans=None, position=self.pos)
+
+    def find_scan_end(self):
+        """ Look for the marker ending the scan in buffered data, scan data
+        is available to the reader up to it
+        """
+        buf = self.buffer
+        n = len(buf)
+        i = self.search_pos - self.base
+        while True:
+            i = buf.find(0xFF, i)
+            if i < 0:
+                i = n
+                break
+            if i + 1 >= n:
+                break
+            byte = buf[i + 1]
+            if byte == 0 or 0xD0 <= byte <= 0xD7:
+                i += 2
+                continue
+            self.scan_end = self.base + i
+            break
+        self.search_pos = self.base + i
+        self.source.limit = self.base + i
+
+    def decode_scan(self):
+        if self.scan_end is None:
+            self.find_scan_end()
+        source = self.source
+        reader = self.reader
+        img = self.image
+        scan = img.scans[-1]
+        blocks_x, _ = get_scan_blocks_size(scan)
+        start = time.perf_counter()
+        while True:
+            if self.scan_end is None:
+                available = source.limit - source.pos + reader.chunk_len - reader.chunk_it
+                if available < self.mcu_bytes:
+                    self.trim(source.pos)
+                    self.scan_time += time.perf_counter() - start
+                    return False
+            if self.check:
+                self.check()
+            mcu = next(self.scan_mcus, None)
+            if mcu is None:
+                break
+            self.mcus += 1
+            row, col = mcu
+            if img.observer and col == blocks_x - 1:
+                img.observer('rows', index=len(img.scans) - 1, row=row)
+        self.scan_time += time.perf_counter() - start
+
+        if self.scan_end is None:
+            self.find_scan_end()
+            if self.scan_end is None:
+                return False
+        img.emit('scan_end', index=len(img.scans) - 1, nbytes=self.scan_end - scan.position,
+                 blocks=get_scan_blocks(scan), elapsed=self.scan_time)
+        self.scan_mcus = None
+        self.source = self.reader = None
+        self.pos = self.scan_end
+        return True
+
+    def finish(self):
+        img = self.image
+        img.fp = None
+        img.coefficients_decoded = True
+        for comp in img.frame.components:
+            img.finish_component(comp, self.check)
+        img.is_valid = True
+        self.done = True
+
+
+def decode_stream(chunks, limits=None, check=None, observer=None):
+    """ Decode image from iterable of byte chunks """
+    decoder = StreamDecoder(limits, check, observer)
+    for chunk in chunks:
+        decoder.feed(chunk)
+    return decoder.close()
+
+def decode_file(fp, chunk_len=CHUNK_LEN, limits=None, check=None, observer=None):
+    """ Decode image reading fp once in order, without seek and tell, so
+    fp could be a pipe, socket or stdin
+    """
+    return decode_stream(iter(lambda: fp.read(chunk_len), b''), limits, check, observer)
@@ -0,0 +1,79 @@
+""" Process-wide memo of decode structures built from DHT and DQT segments.
+Most files carry the same standard tables, so each table is built once and
+shared by all scans and images. Cached objects must not be modified.
+"""
+from io import BytesIO
+from threading import Lock
+from collections import OrderedDict
+
+from . import huffman
+from .huffman.decoding import DecodeTable
+from .zigzag import dezigzag
+from .utils import make_array
+
+
+MAX_TABLES = 64
+
+
+class TableCache:
+    """ LRU mapping of raw table bytes to built table, shared by threads
+    decoding concurrently
+    """
+
+    def __init__(self, build, max_size=MAX_TABLES):
+        self.build = build
+        self.max_size = max_size
+        self.tables = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def __call__(self, raw):
+        with self.lock:
+            table = self.tables.get(raw)
+            if table is not None:
+                self.tables.move_to_end(raw)
+                self.hits += 1
+                return table
+            self.misses += 1
+
+        # built outside of lock, a table built twice by racing threads is
+        # equal, the first one stored is kept
+        table = self.build(raw)
+        with self.lock:
+            table = self.tables.setdefault(raw, table)
+            self.tables.move_to_end(raw)
+            if len(self.tables) > self.max_size:
+                self.tables.popitem(last=False)
+        return table
+
+    def clear(self):
+        with self.lock:
+            self.tables.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+def build_huffman_table(raw):
+    return DecodeTable(huffman.decode_table(BytesIO(raw)))
+
+def build_quantization_table(raw):
+    dequant = make_array('B', 64)
+    for i, z in enumerate(dezigzag):
+        dequant[z] = raw[i]
+    return dequant
+
+# raw Huffman table is 16 counts of codes of each length followed by
+# symbols, raw quantization table is 64 values in zigzag order
+get_huffman_table = TableCache(build_huffman_table)
+get_quantization_table = TableCache(build_quantization_table)
+
+def read_huffman_table(data):
+    """ Raw Huffman table from DHT segment data """
+    sizes = data.read(16)
+    if len(sizes) < 16:
+        raise SyntaxError('bad DHT table')
+    values = data.read(sum(sizes))
+    if len(values) < sum(sizes):
+        raise SyntaxError('bad DHT table')
+    return sizes + values
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import pytest
+from jpeg import aio
+from jpeg.aio import decode_async, decode_data, make_check
+from jpeg.limits import DecodeCancelled, Limits, LimitExceeded
+from .test_loading import get_path, raw_loading
+
+
+def read_data(filename):
+    with open(get_path(filename), 'rb') as f:
+        return f.read()
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+async def decode_bytes(data, executor, **opts):
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return await decode_async(reader, executor, chunk_len=1000, **opts)
+
+@pytest.mark.parametrize('executor_type', [ThreadPoolExecutor, ProcessPoolExecutor])
+def test_decode_async(executor_type):
+    expected = raw_loading('divine-flux2.jpg')
+    with executor_type(max_workers=1) as executor:
+        img = run(decode_bytes(read_data('divine-flux2.jpg'), executor))
+    assert img.is_valid
+    assert img.get_linearized_data() == expected.get_linearized_data()
+
+def test_decode_async_opts():
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        with pytest.raises(LimitExceeded):
+            run(decode_bytes(read_data('divine-flux2.jpg'), executor,
+                             limits=Limits(max_pixels=100)))
+
+def test_check_polling():
+    cancel = threading.Event()
+    check = make_check(cancel, interval=60)
+    check()
+    cancel.set()
+    # the next poll is after the interval
+    check()
+    with pytest.raises(DecodeCancelled):
+        make_check(cancel, interval=60)()
+
+def test_decode_cancelled():
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(DecodeCancelled):
+        decode_data(read_data('divine-flux3.jpg'), cancel)
+
+def test_decode_async_cancel(monkeypatch):
+    outcome = []
+    started = threading.Event()
+
+    def tracked_decode(data, cancel):
+        started.set()
+        cancel.wait(5)
+        try:
+            return decode_data(data, cancel)
+        except DecodeCancelled:
+            outcome.append('cancelled')
+            raise
+    monkeypatch.setattr(aio, 'decode_data', tracked_decode)
+
+    async def main(executor):
+        task = asyncio.ensure_future(decode_bytes(read_data('divine-flux4.jpg'), executor))
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        run(main(executor))
+    assert outcome == ['cancelled']
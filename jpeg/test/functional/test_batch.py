@@ -0,0 +1,73 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pytest
+from jpeg.batch import decode_many
+from jpeg.limits import Limits
+from .test_loading import get_path, raw_loading, testdata
+
+
+@pytest.fixture(scope='module')
+def executor():
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        yield pool
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_decode_many(executor, ordered):
+    filenames = [d.filename for d in testdata]
+    with open(get_path(filenames[0]), 'rb') as f:
+        items = [get_path(name) for name in filenames[1:]] + [f.read(), get_path('missing.jpg')]
+    filenames.append(filenames[0])
+
+    results = list(decode_many(items, ordered=ordered, max_in_flight=3, executor=executor))
+    if ordered:
+        assert [r.index for r in results] == list(range(len(items)))
+    results.sort(key=lambda r: r.index)
+
+    assert results[-1].image is None
+    assert results[-1].error.startswith('FileNotFoundError')
+    for result, name in zip(results, filenames[1:]):
+        expected = raw_loading(name)
+        assert result.error is None
+        assert result.image.format == expected.get_format()
+        assert (result.image.w, result.image.h) == (128, 128)
+        assert result.image.data == bytes(expected.get_linearized_data())
+
+def test_decode_many_limits(executor):
+    items = [get_path('divine-flux.jpg')]
+    result, = decode_many(items, limits=Limits(max_pixels=100), executor=executor)
+    assert result.error.startswith('LimitExceeded')
+
+@pytest.mark.skipif(not os.path.isdir('/dev/shm'), reason='POSIX shared memory is not in /dev/shm')
+@pytest.mark.parametrize('ordered', [True, False])
+def test_decode_many_closed_early(executor, ordered):
+    before = set(os.listdir('/dev/shm'))
+    items = [get_path(d.filename) for d in testdata]
+    results = decode_many(items, ordered=ordered, max_in_flight=4, executor=executor)
+    for _ in results:
+        break
+    results.close()
+    assert set(os.listdir('/dev/shm')) - before == set()
+
+def corrupt(data, pos, n=8):
+    data = bytearray(data)
+    for i in range(pos, pos + n):
+        data[i] ^= 0x5A
+    return bytes(data)
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_decode_many_corrupt(executor, ordered):
+    with open(get_path('divine-flux.jpg'), 'rb') as f:
+        data = f.read()
+    # entropy data corrupted so that decoding fails with IndexError
+    items = [data, corrupt(data, 38128), data]
+    results = list(decode_many(items, ordered=ordered, executor=executor))
+    if ordered:
+        assert [r.index for r in results] == [0, 1, 2]
+    results.sort(key=lambda r: r.index)
+
+    assert results[1].image is None
+    assert results[1].error.startswith('IndexError')
+    expected = bytes(raw_loading('divine-flux.jpg').get_linearized_data())
+    for result in (results[0], results[2]):
+        assert result.error is None
+        assert result.image.data == expected
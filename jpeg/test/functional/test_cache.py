@@ -0,0 +1,69 @@
+import os
+import pytest
+from jpeg.cache import ImageCache, DiskCache, DecodedImage
+from .test_loading import get_path, raw_loading
+
+
+IMAGE_BYTES = 128 * 128 * 3
+
+def test_cache_hits():
+    cache = ImageCache()
+    expected = raw_loading('divine-flux.jpg').get_linearized_data()
+    path = get_path('divine-flux.jpg')
+    for _ in range(3):
+        image = cache.get_file(path)
+        assert (image.format, image.w, image.h) == ('YCbCr', 128, 128)
+        assert bytes(image.data) == bytes(expected)
+    stats = cache.get_stats()
+    assert (stats['misses'], stats['hits']) == (1, 2)
+    assert stats['bytes'] == IMAGE_BYTES
+
+def test_cache_region():
+    cache = ImageCache()
+    path = get_path('divine-flux3.jpg')
+    image = cache.get_file(path, (8, 8, 16, 4))
+    assert (image.w, image.h, len(image.data)) == (16, 4, 64)
+    cache.get_file(path)
+    assert cache.get_stats()['misses'] == 2
+
+def test_cache_eviction():
+    cache = ImageCache(max_bytes=IMAGE_BYTES * 2)
+    names = ['divine-flux.jpg', 'divine-flux2.jpg', 'divine-flux4.jpg']
+    for name in names:
+        cache.get_file(get_path(name))
+    stats = cache.get_stats()
+    assert (stats['evictions'], stats['images']) == (1, 2)
+    cache.get_file(get_path(names[0]))
+    assert cache.get_stats()['misses'] == 4
+
+@pytest.mark.parametrize('name', ['divine-flux2.jpg', 'divine-flux3.jpg'])
+def test_cache_disk(tmp_path, name):
+    path = get_path(name)
+    expected = ImageCache().get_file(path)
+    ImageCache(cache_dir=str(tmp_path)).get_file(path)
+
+    cache = ImageCache(cache_dir=str(tmp_path))
+    image = cache.get_file(path)
+    assert cache.get_stats()['disk_hits'] == 1
+    assert image[:3] == expected[:3]
+    assert bytes(image.data) == bytes(expected.data)
+
+def test_cache_disk_eviction(tmp_path):
+    disk = DiskCache(str(tmp_path), max_bytes=250, max_entries=2)
+    image = lambda n: DecodedImage('L', 10, 10, bytes([n]) * 100)
+    assert disk.put('a', image(1)) == 0
+    assert disk.put('b', image(2)) == 0
+    os.utime(disk.get_path('a', '.raw'), ns=(1, 1))
+    os.utime(disk.get_path('b', '.raw'), ns=(2, 2))
+
+    # hit makes a the most recently used
+    assert bytes(disk.get('a').data) == bytes([1]) * 100
+    assert disk.put('c', image(3)) == 1
+    assert disk.get('b') is None
+    assert sorted(os.listdir(str(tmp_path))) == ['a.json', 'a.raw', 'c.json', 'c.raw']
+
+    disk.max_entries = None
+    os.utime(disk.get_path('c', '.raw'), ns=(1, 1))
+    assert disk.put('d', image(4)) == 1
+    assert disk.get('c') is None
+    assert disk.get('a') is not None
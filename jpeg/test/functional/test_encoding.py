@@ -0,0 +1,81 @@
+import math
+from io import BytesIO
+import pytest
+from jpeg import JpegImage, write_jpeg
+from .test_loading import raw_loading
+
+
+def psnr(a, b):
+    mse = sum((x - y) ** 2 for x, y in zip(a, b)) / len(a)
+    return 10 * math.log10(255 ** 2 / mse) if mse else math.inf
+
+def crop(pixels, width, w, h, n):
+    result = bytearray()
+    for y in range(h):
+        result += pixels[y * width * n:(y * width + w) * n]
+    return result
+
+def reload(output):
+    output.seek(0)
+    img = JpegImage(output)
+    img.process()
+    assert img.is_valid
+    return img
+
+@pytest.fixture(scope='module')
+def source():
+    img = raw_loading('divine-flux.jpg')
+    return img.get_linearized_data()
+
+@pytest.mark.parametrize('sampling', [
+    ((1, 1), (1, 1), (1, 1)),
+    ((2, 1), (1, 1), (1, 1)),
+    ((1, 2), (1, 1), (1, 1)),
+    ((2, 2), (1, 1), (1, 1)),
+])
+def test_encode_ycbcr(source, sampling):
+    output = BytesIO()
+    write_jpeg(output, 'YCbCr', 128, 128, source, quality=90, sampling=sampling)
+    img = reload(output)
+    assert img.get_format() == 'YCbCr'
+    assert tuple(c.sampling for c in img.frame.components) == sampling
+    assert psnr(img.get_linearized_data(), source) > 34
+
+def test_encode_grayscale(source):
+    pixels = source[0::3]
+    output = BytesIO()
+    write_jpeg(output, 'L', 128, 128, pixels, quality=90)
+    img = reload(output)
+    assert img.get_format() == 'L'
+    assert psnr(img.get_linearized_data(), pixels) > 38
+
+def test_encode_odd_size(source):
+    w, h = 101, 77
+    pixels = crop(source, 128, w, h, 3)
+    output = BytesIO()
+    write_jpeg(output, 'YCbCr', w, h, pixels, quality=90)
+    img = reload(output)
+    assert (img.frame.w, img.frame.h) == (w, h)
+    assert psnr(img.get_linearized_data(), pixels) > 34
+
+def test_encode_quality(source):
+    sizes = []
+    for quality in (30, 60, 95):
+        output = BytesIO()
+        write_jpeg(output, 'YCbCr', 128, 128, source, quality=quality)
+        sizes.append(len(output.getvalue()))
+    assert sizes == sorted(sizes)
+
+def test_encode_optimize(source):
+    output = BytesIO()
+    write_jpeg(output, 'YCbCr', 128, 128, source, quality=75)
+    optimized = BytesIO()
+    write_jpeg(optimized, 'YCbCr', 128, 128, source, quality=75, optimize=True)
+    assert len(optimized.getvalue()) < len(output.getvalue())
+    img = reload(output)
+    img2 = reload(optimized)
+    assert img.get_linearized_data() == img2.get_linearized_data()
+
+def test_encode_bad_format():
+    with pytest.raises(ValueError):
+        write_jpeg(BytesIO(), 'CMYK', 1, 1, b'\x00' * 4)
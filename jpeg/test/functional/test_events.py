@@ -0,0 +1,90 @@
+from io import BytesIO
+from jpeg import JpegImage
+from jpeg.events import Observer, PrintObserver, StageTimer
+from jpeg.stream import decode_file, decode_stream
+from .test_loading import get_path
+
+
+class Recorder(Observer):
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event, **info):
+        self.events.append((event, info))
+        super().__call__(event, **info)
+
+    def get(self, name):
+        return [info for event, info in self.events if event == name]
+
+def process(filename, observer):
+    with open(get_path(filename), 'rb') as f:
+        img = JpegImage(f, observer=observer)
+        img.process()
+    return img
+
+def test_silent_by_default(capsys):
+    assert process('divine-flux4.jpg', None).is_valid
+    assert capsys.readouterr().out == ''
+
+def test_print_observer(capsys):
+    process('divine-flux4.jpg', PrintObserver())
+    out = capsys.readouterr().out
+    assert 'Progressive' in out
+    assert 'Scan 9/10' in out
+
+def test_events():
+    recorder = Recorder()
+    img = process('divine-flux2.jpg', recorder)
+    names = [event for event, _ in recorder.events]
+    assert names[0] == 'parse_start'
+    assert names.index('parse_end') < names.index('frame') < names.index('scan_start')
+    assert len(recorder.get('marker')) == len(img.marker_codes)
+
+    scan_end, = recorder.get('scan_end')
+    assert scan_end['blocks'] == 8 * 8 * 6
+    assert 0 < scan_end['nbytes'] < 4192
+    assert [info['row'] for info in recorder.get('rows')] == list(range(8))
+    assert [info['blocks'] for info in recorder.get('finish_end')] == [256, 64, 64]
+
+def test_stream_events():
+    recorder = Recorder()
+    with open(get_path('divine-flux4.jpg'), 'rb') as f:
+        decode_file(f, chunk_len=1000, observer=recorder)
+    expected = Recorder()
+    process('divine-flux4.jpg', expected)
+    nbytes = lambda r: [info['nbytes'] for info in r.get('scan_end')]
+    assert nbytes(recorder) == nbytes(expected)
+    assert len(recorder.get('rows')) == len(expected.get('rows'))
+
+def test_stream_print_observer(capsys):
+    with open(get_path('divine-flux4.jpg'), 'rb') as f:
+        data = f.read()
+    recorder = Recorder()
+    decode_stream([data[:500], data[500:]], observer=recorder)
+    frame, = recorder.get('frame')
+    assert frame['image'].frame.progressive
+    assert [info['scans'] for info in recorder.get('scan_start')] == [None] * 10
+
+    decode_stream([data], observer=PrintObserver())
+    out = capsys.readouterr().out
+    assert 'Size: 128 128' in out
+    assert 'Scan 9\n' in out
+    assert 'None' not in out
+
+def test_stage_timer():
+    timer = StageTimer()
+    for filename in ('divine-flux.jpg', 'divine-flux4.jpg'):
+        process(filename, timer)
+    first, second = timer.report()
+    assert len(first['scans']) == 1
+    assert len(second['scans']) == 10
+    assert second['total'] >= second['entropy'] > 0
+    assert first['parse'] > 0 and first['finish'] > 0
+
+def test_error_event():
+    recorder = Recorder()
+    with open(get_path('divine-flux.jpg'), 'rb') as f:
+        img = JpegImage(BytesIO(f.read(1000)), observer=recorder)
+    img.process()
+    assert not img.is_valid
+    assert recorder.get('error')[0]['message'] == 'Unexpected End-of-file'
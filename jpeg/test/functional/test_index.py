@@ -0,0 +1,109 @@
+import os
+import json
+import shutil
+from io import StringIO
+import pytest
+from jpeg import JpegImage
+from jpeg.core import DQT
+from jpeg.image_index import save_index, load_index, open_indexed, get_index_path
+from .test_loading import get_path, raw_loading, testdata
+
+
+@pytest.mark.parametrize('filename', [d.filename for d in testdata])
+def test_index(filename):
+    expected = raw_loading(filename)
+    with open(get_path(filename), 'rb') as f:
+        img = JpegImage(f)
+        img.parse()
+        sidecar = StringIO()
+        save_index(img, sidecar)
+        sidecar.seek(0)
+
+        img = load_index(JpegImage(f), sidecar)
+        assert img.marker_codes == expected.marker_codes
+        assert len(img.scans) == len(expected.scans)
+        # tables are shared with parsed images
+        for qc, table in expected.quantization.items():
+            assert img.quantization[qc] is table
+        img.decode()
+    assert img.get_linearized_data() == expected.get_linearized_data()
+
+def test_index_mismatch():
+    with open(get_path('divine-flux2.jpg'), 'rb') as f:
+        img = JpegImage(f)
+        img.parse()
+        sidecar = StringIO()
+        save_index(img, sidecar)
+    sidecar.seek(0)
+    with open(get_path('divine-flux3.jpg'), 'rb') as f:
+        with pytest.raises(ValueError):
+            load_index(JpegImage(f), sidecar)
+
+@pytest.mark.parametrize('use_cache_dir', [False, True])
+def test_open_indexed(tmp_path, use_cache_dir):
+    path = str(tmp_path / 'image.jpg')
+    shutil.copy(get_path('divine-flux.jpg'), path)
+    cache_dir = str(tmp_path / 'cache') if use_cache_dir else None
+    index_path = get_index_path(path, cache_dir)
+    expected = raw_loading('divine-flux.jpg').get_linearized_data()
+
+    with open(path, 'rb') as f:
+        img = open_indexed(f, path, cache_dir)
+        assert os.path.exists(index_path)
+        assert img.restart_index
+        img.decode()
+    assert img.get_linearized_data() == expected
+
+    with open(path, 'rb') as f:
+        img = open_indexed(f, path, cache_dir)
+        assert img.restart_index
+        region = img.decode_region(0, 0, 128, 8)
+    assert region == expected[:128 * 8 * 3]
+
+def test_open_indexed_rewritten(tmp_path):
+    path = str(tmp_path / 'image.jpg')
+    shutil.copy(get_path('divine-flux2.jpg'), path)
+    with open(path, 'rb') as f:
+        img = open_indexed(f, path)
+        qt = img.quantization[0]
+        dqt = next(pos for _, marker, pos in img.marker_codes if marker == DQT)
+
+    # the same length and modification time, other quantization table
+    stat = os.stat(path)
+    with open(path, 'r+b') as f:
+        f.seek(dqt + 3)
+        value = f.read(1)[0]
+        f.seek(dqt + 3)
+        f.write(bytes([value ^ 1]))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    with open(path, 'rb') as f:
+        img = open_indexed(f, path)
+    assert img.quantization[0][0] == qt[0] ^ 1
+
+def test_open_indexed_not_writable(tmp_path):
+    path = str(tmp_path / 'image.jpg')
+    shutil.copy(get_path('divine-flux.jpg'), path)
+    cache_dir = tmp_path / 'cache'
+    cache_dir.write_bytes(b'')
+    with open(path, 'rb') as f:
+        img = open_indexed(f, path, str(cache_dir))
+        img.decode()
+    assert img.get_linearized_data() == raw_loading('divine-flux.jpg').get_linearized_data()
+
+def test_open_indexed_malformed(tmp_path):
+    path = str(tmp_path / 'image.jpg')
+    shutil.copy(get_path('divine-flux2.jpg'), path)
+    with open(path, 'rb') as f:
+        open_indexed(f, path)
+    index_path = get_index_path(path)
+    with open(index_path) as f:
+        index = json.load(f)
+    index['quantization']['0'] = 5
+    with open(index_path, 'w') as f:
+        json.dump(index, f)
+
+    with open(path, 'rb') as f:
+        img = open_indexed(f, path)
+        img.decode()
+    assert img.get_linearized_data() == raw_loading('divine-flux2.jpg').get_linearized_data()
@@ -0,0 +1,48 @@
+from io import BytesIO
+import pytest
+from jpeg import JpegImage
+from jpeg.limits import Limits, CancelToken, LimitExceeded, DeadlineExceeded, DecodeCancelled
+from jpeg.stream import decode_file
+from .test_loading import get_path
+
+
+def parse(filename, limits):
+    with open(get_path(filename), 'rb') as f:
+        img = JpegImage(BytesIO(f.read()), limits)
+    img.parse()
+    return img
+
+@pytest.mark.parametrize('limits', [
+    Limits(max_pixels=128 * 128 - 1),
+    Limits(max_memory=100000),
+    Limits(max_scans=9),
+])
+def test_limit_exceeded(limits):
+    with pytest.raises(LimitExceeded):
+        parse('divine-flux4.jpg', limits)
+    with open(get_path('divine-flux4.jpg'), 'rb') as f:
+        with pytest.raises(LimitExceeded):
+            decode_file(f, limits=limits)
+
+def test_within_limits():
+    img = parse('divine-flux4.jpg', Limits(128 * 128, 10 << 20, 10))
+    assert len(img.scans) == 10
+
+def test_deadline():
+    img = parse('divine-flux.jpg', None)
+    with pytest.raises(DeadlineExceeded):
+        img.decode(CancelToken(timeout=0.01).check)
+
+def test_cancel_while_finishing():
+    token = CancelToken()
+    img = parse('divine-flux3.jpg', None)
+    img.decode_coefficients(token.check)
+    token.cancel()
+    with pytest.raises(DecodeCancelled):
+        img.finish_component(img.frame.components[0], token.check)
+
+def test_process_aborted():
+    with open(get_path('divine-flux2.jpg'), 'rb') as f:
+        img = JpegImage(f, Limits(max_pixels=100))
+        img.process()
+    assert img.is_valid is False
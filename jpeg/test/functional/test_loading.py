@@ -1,7 +1,10 @@
 import os
 import pytest
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from jpeg import JpegImage
+from jpeg.core import SharedPool
+from jpeg.limits import DecodeCancelled
 
 
 ImgData = namedtuple('ImgData', 'filename, format, size, sampling')
@@ -43,6 +46,50 @@ def test_loading(img_data):
     data = img.get_linearized_data()
     assert data
 
+def test_loading_pipelined(img_data):
+    img = raw_loading(img_data.filename)
+    path = get_path(img_data.filename)
+    with open(path, 'rb') as f:
+        img2 = JpegImage(f)
+        img2.read_markers()
+        img2.validate_markers()
+        img2.parse_marker_blocks()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            img2.decode_pipelined(executor)
+    assert img2.get_linearized_data() == img.get_linearized_data()
+
+def test_loading_pipelined_process_pool():
+    img = raw_loading('divine-flux5.jpg')
+    with open(get_path('divine-flux5.jpg'), 'rb') as f:
+        img2 = JpegImage.open(f)
+        img2.decode_pipelined(workers=2)
+    assert img2.get_linearized_data() == img.get_linearized_data()
+
+def test_shared_pool():
+    pool = SharedPool()
+    executor = pool.get(1)
+    assert pool.get(1) is executor
+    executor2 = pool.get(2)
+    assert executor2 is not executor
+    with pytest.raises(RuntimeError):
+        executor.submit(abs, -1)
+    pool.shutdown()
+    with pytest.raises(RuntimeError):
+        executor2.submit(abs, -1)
+    assert pool.get(2) is not executor2
+    pool.shutdown()
+
+def test_loading_pipelined_cancelled():
+    def check():
+        raise DecodeCancelled()
+
+    with open(get_path('divine-flux.jpg'), 'rb') as f:
+        img = JpegImage.open(f)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            with pytest.raises(DecodeCancelled):
+                img.decode_pipelined(executor, check=check)
+    assert not img.coefficients_decoded
+
 def test_loading_failed():
     img = raw_loading('divine-flux.png')
     assert not img.is_valid
@@ -56,3 +103,44 @@ def test_is_not_jpeg():
     path = get_path('divine-flux.png')
     with open(path, 'rb') as f:
         assert not JpegImage.is_jpeg(f)
+
+def test_embedded_thumbnail():
+    path = get_path('divine-flux.jpg')
+    with open(path, 'rb') as f:
+        img = JpegImage(f)
+        data = img.get_embedded_thumbnail()
+        assert data[:3] == b'\xFF\xD8\xFF'
+        assert img.frame is None
+        thumbnail = img.get_embedded_thumbnail(decode=True)
+    assert thumbnail.is_valid
+    assert (thumbnail.frame.w, thumbnail.frame.h) == (160, 160)
+
+def test_no_embedded_thumbnail():
+    path = get_path('divine-flux2.jpg')
+    with open(path, 'rb') as f:
+        img = JpegImage(f)
+        f.seek(100)
+        assert img.get_embedded_thumbnail() is None
+        assert f.tell() == 100
+        # header is scanned once
+        img.fp = None
+        assert img.get_embedded_thumbnail() is None
+
+def test_no_embedded_thumbnail_parsed():
+    expected = raw_loading('divine-flux2.jpg')
+    expected.fp = None
+    assert expected.get_embedded_thumbnail() is None
+
+def test_lazy_loading():
+    expected = raw_loading('divine-flux2.jpg')
+    with open(get_path('divine-flux2.jpg'), 'rb') as f:
+        img = JpegImage.open(f)
+        assert (img.frame.w, img.frame.h) == (128, 128)
+        assert not img.coefficients_decoded
+
+        luma = img.get_plane(0)
+        assert img.finished_components == {img.frame.components[0].id}
+        assert luma == expected.get_linearized_data()[0::3]
+
+        assert img.pixels == expected.get_linearized_data()
+        assert len(img.finished_components) == 3
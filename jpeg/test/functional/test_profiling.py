@@ -0,0 +1,35 @@
+import os
+import pstats
+import tracemalloc
+from jpeg import JpegImage
+from .test_loading import get_path, raw_loading
+
+
+def test_process_profile(tmp_path):
+    path = str(tmp_path / 'decode.pstats')
+    with open(get_path('divine-flux5.jpg'), 'rb') as f:
+        img = JpegImage(f)
+        img.process(profile=True, profile_path=path)
+    assert img.is_valid
+    assert img.observer is None
+    assert img.get_linearized_data() == raw_loading('divine-flux5.jpg').get_linearized_data()
+
+    assert os.path.exists(path)
+    assert pstats.Stats(path).total_calls > 0
+    report = img.profile_report
+    for stage in ('parse', 'entropy', 'finish'):
+        assert 'Allocations of {} stage'.format(stage) in report
+
+def test_process_profile_tracing(tmp_path):
+    path = str(tmp_path / 'decode.pstats')
+    tracemalloc.start()
+    try:
+        data = bytearray(1 << 20)
+        with open(get_path('divine-flux5.jpg'), 'rb') as f:
+            img = JpegImage(f)
+            img.process(profile=True, profile_path=path)
+        assert tracemalloc.is_tracing()
+        assert tracemalloc.get_object_traceback(data) is not None
+    finally:
+        tracemalloc.stop()
+    assert img.is_valid
@@ -0,0 +1,86 @@
+import json
+from io import BytesIO, StringIO
+import pytest
+from jpeg import JpegImage, write_jpeg
+from jpeg.image_index import save_index, load_index
+from .test_loading import get_path, raw_loading, testdata
+
+
+def crop(pixels, width, n, box):
+    x, y, w, h = box
+    result = bytearray()
+    for row in range(y, y + h):
+        result += pixels[(row * width + x) * n:(row * width + x + w) * n]
+    return bytes(result)
+
+def parsed(fp):
+    fp.seek(0)
+    img = JpegImage(fp)
+    img.parse()
+    return img
+
+boxes = [(0, 0, 128, 128), (30, 75, 70, 9), (80, 74, 5, 39), (127, 127, 1, 1)]
+
+@pytest.mark.parametrize('filename', [d.filename for d in testdata])
+def test_decode_region(filename):
+    img = raw_loading(filename)
+    pixels = img.get_linearized_data()
+    n = len(img.frame.components)
+    with open(get_path(filename), 'rb') as f:
+        for box in boxes:
+            region = parsed(f).decode_region(*box)
+            assert bytes(region) == crop(pixels, 128, n, box)
+
+@pytest.fixture(scope='module', params=['L', 'YCbCr'])
+def restart_image(request):
+    fmt = request.param
+    n = 1 if fmt == 'L' else 3
+    pixels = raw_loading('divine-flux.jpg').get_linearized_data()
+    pixels = crop(pixels[0::3] if n == 1 else pixels, 128, n, (0, 0, 101, 77))
+    output = BytesIO()
+    write_jpeg(output, fmt, 101, 77, pixels, restart_interval=3)
+    return output
+
+def test_decode_region_indexed(restart_image):
+    img = parsed(restart_image)
+    img.decode()
+    pixels = img.get_linearized_data()
+    n = len(img.frame.components)
+
+    img = parsed(restart_image)
+    index = img.build_restart_index()
+    assert len(index.offsets) == (index.mcus + 2) // 3
+    for box in [(0, 0, 101, 77), (17, 40, 30, 20), (100, 76, 1, 1)]:
+        region = img.decode_region(*box)
+        assert bytes(region) == crop(pixels, 101, n, box)
+
+def test_restart_index_sidecar(restart_image):
+    img = parsed(restart_image)
+    index = img.build_restart_index()
+    sidecar = StringIO()
+    save_index(img, sidecar)
+    sidecar.seek(0)
+    assert json.load(sidecar)['restart']['offsets'] == index.offsets
+    sidecar.seek(0)
+
+    img2 = load_index(JpegImage(restart_image), sidecar)
+    assert img2.restart_index.offsets == index.offsets
+    assert img2.decode_region(10, 10, 20, 20) == img.decode_region(10, 10, 20, 20)
+
+def test_decode_region_truncated():
+    with open(get_path('divine-flux2.jpg'), 'rb') as f:
+        data = f.read()
+    pixels = raw_loading('divine-flux2.jpg').get_linearized_data()
+    # the bottom half of the scan is missing, it should not be read
+    img = JpegImage(BytesIO(data[:len(data) // 2] + b'\xff\xd9'))
+    img.parse()
+    region = img.decode_region(0, 0, 128, 32)
+    assert bytes(region) == crop(pixels, 128, 3, (0, 0, 128, 32))
+
+def test_decode_region_bounds():
+    with open(get_path('divine-flux3.jpg'), 'rb') as f:
+        img = parsed(f)
+        with pytest.raises(ValueError):
+            img.decode_region(100, 100, 29, 1)
+        with pytest.raises(ValueError):
+            img.decode_region(0, 0, 0, 1)
@@ -0,0 +1,81 @@
+import pytest
+from io import BytesIO
+from jpeg import JpegImage
+from jpeg.encoder import write_jpeg
+from jpeg.limits import DecodeCancelled
+from jpeg.stats import CountingDecoder
+from .test_loading import get_path, raw_loading
+
+
+def decode_with_stats(filename):
+    with open(get_path(filename), 'rb') as f:
+        img = JpegImage(f)
+        img.parse()
+        img.enable_stats()
+        img.decode()
+    return img
+
+def test_stats_disabled():
+    assert raw_loading('divine-flux2.jpg').get_stats() is None
+
+def test_stats_baseline():
+    img = decode_with_stats('divine-flux2.jpg')
+    assert img.get_linearized_data() == raw_loading('divine-flux2.jpg').get_linearized_data()
+    stats = img.get_stats()
+
+    scan, = img.scans
+    nbytes = img.get_scan_length(scan)
+    assert 8 * (nbytes - 1) * 0.95 < stats['bits'] <= 8 * nbytes
+
+    y, cb, cr = img.frame.components
+    assert stats['symbols']['dc'] == {y.id: 256, cb.id: 64, cr.id: 64}
+    for kind in ('dc', 'ac'):
+        for idx, lengths in stats['code_lengths'][kind].items():
+            assert sum(lengths.values()) == stats['symbols'][kind][idx]
+            assert max(lengths) <= 16
+    assert stats['eob_runs'] == {}
+    assert stats['blocks'] == 384
+    assert stats['blocks'] >= stats['dc_only_blocks'] >= stats['zero_blocks']
+
+def test_stats_progressive():
+    img = decode_with_stats('divine-flux4.jpg')
+    stats = img.get_stats()
+    assert stats['eob_runs']
+    # each run ends at least one block, a block is ended once per AC scan
+    ac_scans = sum(1 for scan in img.scans if scan.is_ac)
+    assert sum(stats['eob_runs'].values()) < stats['eob_run_blocks'] <= 256 * ac_scans
+    assert max(stats['eob_runs']) > 1
+    assert stats['blocks'] == 3 * 256
+    assert sum(stats['symbols']['ac'].values()) > 0
+
+def test_stats_scan_failed():
+    calls = []
+
+    def check():
+        calls.append(None)
+        if len(calls) == 2:
+            raise DecodeCancelled()
+
+    with open(get_path('divine-flux4.jpg'), 'rb') as f:
+        img = JpegImage(f)
+        img.parse()
+        img.enable_stats()
+        with pytest.raises(DecodeCancelled):
+            img.decode(check)
+    scan = img.scans[0]
+    assert scan.eob_runs is None
+    assert not any(isinstance(d, CountingDecoder) for d in scan.huffman_dc.values())
+    assert img.get_stats()['bits'] > 0
+
+def test_stats_padding_blocks():
+    # 4:2:0 MCU is 16x16, luma has 3x2 blocks of image and 4x2 blocks of MCUs
+    output = BytesIO()
+    write_jpeg(output, 'YCbCr', 20, 13, bytes(20 * 13 * 3), sampling=((2, 2), (1, 1), (1, 1)))
+    output.seek(0)
+    img = JpegImage(output)
+    img.parse()
+    img.enable_stats()
+    img.decode()
+    y, cb, cr = img.frame.components
+    assert y.blocks_size == (4, 2)
+    assert img.get_stats()['blocks'] == 3 * 2 + 2 * 2 * 1
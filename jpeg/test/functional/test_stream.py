@@ -0,0 +1,87 @@
+import os
+import threading
+import pytest
+from jpeg.stream import StreamDecoder, decode_stream, decode_file
+from .test_loading import get_path, raw_loading, testdata
+
+
+def read_data(filename):
+    with open(get_path(filename), 'rb') as f:
+        return f.read()
+
+def iter_chunks(data, size):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+@pytest.mark.parametrize('filename', [d.filename for d in testdata])
+@pytest.mark.parametrize('size', [1, 1000, 1 << 20])
+def test_stream(filename, size):
+    expected = raw_loading(filename)
+    img = decode_stream(iter_chunks(read_data(filename), size))
+    assert img.get_format() == expected.get_format()
+    assert img.get_linearized_data() == expected.get_linearized_data()
+
+def test_stream_overlap():
+    data = read_data('divine-flux4.jpg')
+    decoder = StreamDecoder()
+    decoder.feed(data[:-2000])
+    assert 0 < decoder.mcus
+    decoder.feed(data[-2000:])
+    assert decoder.done
+
+def test_stream_truncated():
+    data = read_data('divine-flux2.jpg')
+    decoder = StreamDecoder()
+    decoder.feed(data[:2000])
+    with pytest.raises(EOFError):
+        decoder.close()
+
+@pytest.mark.parametrize('filename', ['divine-flux2.jpg', 'divine-flux4.jpg'])
+def test_stream_truncated_before_first_scan_end(filename):
+    data = read_data(filename)
+    # the first scan is longer than 100 bytes
+    end = data.index(b'\xff\xda') + 100
+    for n in range(0, end, 7):
+        decoder = StreamDecoder()
+        decoder.feed(data[:n])
+        with pytest.raises(EOFError):
+            decoder.close()
+
+def test_stream_bad_start():
+    with pytest.raises(SyntaxError):
+        StreamDecoder().feed(b'\xff\xd9')
+
+def remove_segments(data, code):
+    """ data without header segments of marker code """
+    result = bytearray(data[:2])
+    i = 2
+    while data[i + 1] != 0xDA:
+        end = i + 2 + ((data[i + 2] << 8) | data[i + 3])
+        if data[i + 1] != code:
+            result += data[i:end]
+        i = end
+    return bytes(result + data[i:])
+
+@pytest.mark.parametrize('filename', ['divine-flux.jpg', 'divine-flux2.jpg'])
+@pytest.mark.parametrize('code', [0xDB, 0xC4])
+def test_stream_missing_tables(filename, code):
+    data = remove_segments(read_data(filename), code)
+    with pytest.raises(SyntaxError):
+        decode_stream([data])
+
+@pytest.mark.parametrize('filename', ['divine-flux2.jpg', 'divine-flux4.jpg'])
+def test_decode_pipe(filename):
+    expected = raw_loading(filename)
+    data = read_data(filename)
+    r, w = os.pipe()
+
+    def write():
+        with os.fdopen(w, 'wb') as f:
+            f.write(data)
+    writer = threading.Thread(target=write)
+    writer.start()
+    with os.fdopen(r, 'rb') as f:
+        assert not f.seekable()
+        img = decode_file(f, chunk_len=512)
+    writer.join()
+    assert img.is_valid
+    assert img.get_linearized_data() == expected.get_linearized_data()
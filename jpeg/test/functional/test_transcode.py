@@ -0,0 +1,123 @@
+import os
+from io import BytesIO
+import pytest
+from jpeg import JpegImage
+from jpeg.core import APP, COM
+from jpeg.transcode import optimize, requantize, to_baseline, to_progressive
+from jpeg.transcode import transcode_files
+from .test_loading import get_path, raw_loading, testdata
+
+
+def load(fp):
+    fp.seek(0)
+    img = JpegImage(fp)
+    img.process()
+    assert img.is_valid
+    return img
+
+def coefficients(fp):
+    fp.seek(0)
+    img = JpegImage(fp)
+    img.parse()
+    img.decode_coefficients()
+    return [list(map(list, c.blocks)) for c in img.frame.components]
+
+def get_markers(img):
+    return [marker for _, marker, _ in img.marker_codes]
+
+@pytest.mark.parametrize('filename', [d.filename for d in testdata])
+def test_optimize(filename):
+    img = raw_loading(filename)
+    output = BytesIO()
+    with open(get_path(filename), 'rb') as f:
+        optimize(f, output)
+    result = load(output)
+    assert not result.frame.progressive
+    assert result.get_linearized_data() == img.get_linearized_data()
+    assert get_markers(result).count(APP) == get_markers(img).count(APP)
+
+def test_optimize_strip():
+    filename = 'divine-flux.jpg'
+    output = BytesIO()
+    with open(get_path(filename), 'rb') as f:
+        optimize(f, output, copy='none')
+    assert len(output.getvalue()) < os.path.getsize(get_path(filename)) / 2
+    result = load(output)
+    assert not result.exif
+    # Adobe segment is needed for colors
+    assert result.adobe
+    assert get_markers(result).count(APP) == 1
+    assert COM not in get_markers(result)
+
+def test_optimize_bad_copy():
+    with open(get_path('divine-flux3.jpg'), 'rb') as f:
+        with pytest.raises(ValueError):
+            optimize(f, BytesIO(), copy='some')
+
+def test_requantize():
+    filename = 'divine-flux2.jpg'
+    img = raw_loading(filename)
+    sizes = []
+    for quality in (50, 20):
+        output = BytesIO()
+        with open(get_path(filename), 'rb') as f:
+            requantize(f, output, quality=quality)
+        result = load(output)
+        qt = result.quantization[0]
+        assert all(a >= b for a, b in zip(qt, img.quantization[0]))
+        assert result.get_linearized_data() != img.get_linearized_data()
+        sizes.append(len(output.getvalue()))
+    assert sizes[0] < os.path.getsize(get_path(filename))
+    assert sizes[1] < sizes[0]
+
+def test_requantize_same_table():
+    filename = 'divine-flux3.jpg'
+    img = raw_loading(filename)
+    output = BytesIO()
+    with open(get_path(filename), 'rb') as f:
+        requantize(f, output, tables={0: [1] * 64})
+    result = load(output)
+    assert result.get_linearized_data() == img.get_linearized_data()
+
+def test_requantize_tables():
+    filename = 'divine-flux3.jpg'
+    output = BytesIO()
+    with open(get_path(filename), 'rb') as f:
+        requantize(f, output, tables={0: [100] * 64})
+    result = load(output)
+    assert list(result.quantization[0]) == [100] * 64
+
+def test_requantize_bad_args():
+    with open(get_path('divine-flux3.jpg'), 'rb') as f:
+        with pytest.raises(ValueError):
+            requantize(f, BytesIO())
+
+@pytest.mark.parametrize('filename', [d.filename for d in testdata])
+def test_to_progressive(filename):
+    with open(get_path(filename), 'rb') as f:
+        source = coefficients(f)
+        f.seek(0)
+        output = BytesIO()
+        to_progressive(f, output)
+    result = load(output)
+    assert result.frame.progressive
+    assert len(result.scans) > 1
+    assert coefficients(output) == source
+
+def test_progressive_to_baseline():
+    with open(get_path('divine-flux4.jpg'), 'rb') as f:
+        source = coefficients(f)
+        f.seek(0)
+        output = BytesIO()
+        to_baseline(f, output)
+    result = load(output)
+    assert not result.frame.progressive
+    assert coefficients(output) == source
+
+def test_transcode_files(tmp_path):
+    paths = [get_path('divine-flux3.jpg'), get_path('divine-flux.png')]
+    result = list(transcode_files(paths, str(tmp_path), progressive=True))
+    assert result[0] == (paths[0], None)
+    assert result[1][1] is not None
+    with open(str(tmp_path / 'divine-flux3.jpg'), 'rb') as f:
+        assert load(f).frame.progressive
@@ -0,0 +1,76 @@
+from io import BytesIO
+import pytest
+from jpeg import JpegImage, write_jpeg
+from jpeg.transform import transform, operations
+from .test_loading import get_path, raw_loading
+
+
+def transform_pixels(op, w, h, n, pixels):
+    transpose, flip_x, flip_y = operations[op]
+    ow, oh = (h, w) if transpose else (w, h)
+    result = bytearray(ow * oh * n)
+    for y in range(oh):
+        for x in range(ow):
+            tx = ow - 1 - x if flip_x else x
+            ty = oh - 1 - y if flip_y else y
+            sx, sy = (ty, tx) if transpose else (tx, ty)
+            c, sc = (y * ow + x) * n, (sy * w + sx) * n
+            result[c:c+n] = pixels[sc:sc+n]
+    return ow, oh, result
+
+def load(fp):
+    fp.seek(0)
+    img = JpegImage(fp)
+    img.process()
+    assert img.is_valid
+    return img
+
+def coefficients(fp):
+    fp.seek(0)
+    img = JpegImage(fp)
+    img.parse()
+    img.decode_coefficients()
+    return [list(map(list, c.blocks)) for c in img.frame.components]
+
+@pytest.mark.parametrize('filename', ['divine-flux2.jpg', 'divine-flux3.jpg', 'divine-flux4.jpg'])
+@pytest.mark.parametrize('op', sorted(operations))
+def test_transform(filename, op):
+    img = raw_loading(filename)
+    frame = img.frame
+    n = len(frame.components)
+    w, h, expected = transform_pixels(op, frame.w, frame.h, n, img.get_linearized_data())
+
+    output = BytesIO()
+    with open(get_path(filename), 'rb') as f:
+        transform(f, output, op)
+    result = load(output)
+    assert (result.frame.w, result.frame.h) == (w, h)
+    # integer IDCT is not exactly symmetric
+    data = result.get_linearized_data()
+    assert max(abs(a - b) for a, b in zip(data, expected)) <= 1
+
+def test_transform_identity():
+    with open(get_path('divine-flux5.jpg'), 'rb') as f:
+        data = BytesIO(f.read())
+    source = coefficients(data)
+    for _ in range(4):
+        data.seek(0)
+        output = BytesIO()
+        transform(data, output, 'rot90')
+        data = output
+    assert coefficients(data) == source
+
+def test_transform_trim():
+    pixels = bytes(range(100)) * 3 * 30
+    data = BytesIO()
+    write_jpeg(data, 'YCbCr', 100, 30, pixels, sampling=((2, 2), (1, 1), (1, 1)))
+    data.seek(0)
+    output = BytesIO()
+    transform(data, output, 'rot90')
+    img = load(output)
+    assert (img.frame.w, img.frame.h) == (16, 100)
+
+def test_transform_unknown():
+    with open(get_path('divine-flux3.jpg'), 'rb') as f:
+        with pytest.raises(ValueError):
+            transform(f, BytesIO(), 'rot45')
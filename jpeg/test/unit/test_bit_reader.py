@@ -19,3 +19,16 @@ def test_bit_reader_ff00():
     r = BitReader(b)
     bits = tuple(r)
     assert bits == (1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 1, 0, 0, 0, 0, 0)
+
+class ShortReads:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self, n): # pylint: disable=unused-argument
+        data, self.data = self.data[:1], self.data[1:]
+        return data
+
+def test_bit_reader_short_reads():
+    r = BitReader(ShortReads(b'\xa0\xff\x00'))
+    bits = tuple(r)
+    assert bits == (1, 0, 1, 0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 1, 1)
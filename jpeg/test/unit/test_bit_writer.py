@@ -0,0 +1,37 @@
+from io import BytesIO
+from jpeg.scan_encode import BitWriter, get_extra_bits
+from jpeg.scan_decode import BitReader, ext_table
+
+
+def test_bit_writer():
+    b = BytesIO()
+    w = BitWriter(b)
+    w.write(0b101, 3)
+    w.write(0b0, 5)
+    w.write(0b1111, 4)
+    w.flush()
+    assert b.getvalue() == b'\xa0\xff\x00'
+
+def test_bit_writer_ff00():
+    b = BytesIO()
+    w = BitWriter(b)
+    w.write(0xFF, 8)
+    w.write(0b1010, 4)
+    w.flush()
+    assert b.getvalue() == b'\xff\x00\xaf'
+    b.seek(0)
+    bits = tuple(BitReader(b))
+    assert bits[:12] == (1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 1, 0)
+
+def test_bit_writer_marker():
+    b = BytesIO()
+    w = BitWriter(b)
+    w.write(0b1, 1)
+    w.write_marker(0xD0)
+    w.flush()
+    assert b.getvalue() == b'\xff\x00\xff\xd0'
+
+def test_extra_bits():
+    for value in range(-255, 256):
+        s = abs(value).bit_length()
+        assert ext_table(get_extra_bits(value, s), s) == value
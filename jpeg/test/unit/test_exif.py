@@ -0,0 +1,28 @@
+import struct
+from jpeg.exif import get_exif_thumbnail
+
+
+def make_tiff(endian, thumbnail):
+    order = b'II' if endian == '<' else b'MM'
+    ifd0 = struct.pack(endian + 'H', 0) + struct.pack(endian + 'I', 14)
+    ifd1_size = 2 + 2 * 12 + 4
+    offset = 8 + len(ifd0) + ifd1_size
+    ifd1 = struct.pack(endian + 'H', 2)
+    ifd1 += struct.pack(endian + 'HHII', 0x0201, 4, 1, offset)
+    ifd1 += struct.pack(endian + 'HHII', 0x0202, 4, 1, len(thumbnail))
+    ifd1 += struct.pack(endian + 'I', 0)
+    return order + struct.pack(endian + 'HI', 42, 8) + ifd0 + ifd1 + thumbnail
+
+def test_exif_thumbnail():
+    for endian in '<>':
+        data = make_tiff(endian, b'\xFF\xD8thumb')
+        assert get_exif_thumbnail(data) == b'\xFF\xD8thumb'
+
+def test_exif_no_thumbnail():
+    data = b'II' + struct.pack('<HI', 42, 8) + struct.pack('<HI', 0, 0)
+    assert get_exif_thumbnail(data) is None
+
+def test_exif_malformed():
+    assert get_exif_thumbnail(b'') is None
+    assert get_exif_thumbnail(b'XX\x00\x2a\x00\x00\x00\x08') is None
+    assert get_exif_thumbnail(b'II' + struct.pack('<HI', 42, 1000)) is None
@@ -0,0 +1,38 @@
+import math
+import random
+from jpeg.fdct import fdct_2d
+from jpeg.idct import idct_2d
+
+
+def reference_fdct(src):
+    result = []
+    for v in range(8):
+        for u in range(8):
+            cu = 1 / math.sqrt(2) if u == 0 else 1
+            cv = 1 / math.sqrt(2) if v == 0 else 1
+            s = sum(src[y * 8 + x]
+                    * math.cos((2 * x + 1) * u * math.pi / 16)
+                    * math.cos((2 * y + 1) * v * math.pi / 16)
+                    for y in range(8) for x in range(8))
+            result.append(cu * cv * s / 4)
+    return result
+
+def test_fdct():
+    random.seed(0)
+    src = [random.randint(-128, 127) for _ in range(64)]
+    expected = reference_fdct(src)
+    result = fdct_2d(list(src))
+    for a, b in zip(result, expected):
+        assert abs(a / 8 - b) < 0.5
+
+def test_fdct_dc():
+    result = fdct_2d([10] * 64)
+    assert result[0] == 10 * 8 * 8
+    assert not any(result[1:])
+
+def test_fdct_idct():
+    random.seed(1)
+    src = [random.randint(-128, 127) for _ in range(64)]
+    coefs = [round(x / 8) for x in fdct_2d(list(src))]
+    result = idct_2d(coefs)
+    assert all(abs(a - b) <= 1 for a, b in zip(result, src))
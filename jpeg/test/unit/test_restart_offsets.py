@@ -0,0 +1,14 @@
+from io import BytesIO
+from jpeg import index
+from jpeg.index import find_restart_offsets
+
+
+def test_restart_offsets():
+    data = b'\x00\x00' + b'\x12\xff\x00\x34\xff\xd0' + b'\x56\xff\xd1' + b'\x78\xff\xff\xd9'
+    assert find_restart_offsets(BytesIO(data), 2) == [2, 8, 11]
+
+def test_restart_offsets_chunks(monkeypatch):
+    data = b'\x12\xff\x00\x34\xff\xd0\x56\xff\xd1\xff\x00\xff\xd2\x00\xff\xd9'
+    for chunk_len in range(1, 6):
+        monkeypatch.setattr(index, 'CHUNK_LEN', chunk_len)
+        assert find_restart_offsets(BytesIO(data), 0) == [0, 6, 9, 13]
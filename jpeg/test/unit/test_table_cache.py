@@ -0,0 +1,48 @@
+from jpeg.table_cache import TableCache, get_huffman_table, read_huffman_table
+from jpeg.tables import luminance_dc
+import sys
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_table_cache_lru():
+    built = []
+    cache = TableCache(lambda raw: built.append(raw) or raw.upper(), max_size=2)
+    assert cache(b'a') == b'A'
+    cache(b'b')
+    cache(b'a')
+    cache(b'c')
+    cache(b'a')
+    cache(b'b')
+    assert built == [b'a', b'b', b'c', b'b']
+    assert (cache.hits, cache.misses) == (2, 4)
+
+def test_huffman_table_shared():
+    bits, values = luminance_dc
+    data = BytesIO(bytes(bits) + bytes(values) + b'tail')
+    raw = read_huffman_table(data)
+    assert data.read() == b'tail'
+    table = get_huffman_table(raw)
+    assert get_huffman_table(bytes(raw)) is table
+    assert sorted(table.codes) == list(range(12))
+
+def test_table_cache_threads():
+    cache = TableCache(lambda raw: raw.upper(), max_size=3)
+    keys = [bytes([97 + i * i % 7]) for i in range(20000)]
+
+    def lookup(start):
+        keys_order = keys[start:] + keys[:start]
+        return keys_order, [cache(key) for key in keys_order]
+
+    # frequent thread switches to interleave lookups
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lookup, range(4)))
+    finally:
+        sys.setswitchinterval(interval)
+    for keys_order, tables in results:
+        assert tables == [key.upper() for key in keys_order]
+    assert cache.hits + cache.misses == 4 * len(keys)
+    assert len(cache.tables) == 3
@@ -0,0 +1,168 @@
+""" Transcoding of JPEG images done on quantized DCT coefficients,
+pixels are never decoded, thus there is no generation loss
+"""
+import os
+import sys
+import argparse
+from io import BytesIO
+
+from . import tables as std_tables
+from .core import JpegImage, BadMarker, APP, COM, read_block
+from .encoder import write_frame, write_progressive_frame, quantize
+
+
+def is_format_segment(code, payload):
+    """ JFIF and Adobe segments describe colorspace, not metadata """
+    if code == 0xFFE0 and payload.startswith(b'JFIF\x00'):
+        return True
+    if code == 0xFFEE and payload.startswith(b'Adobe\x00'):
+        return True
+    return False
+
+def read_segments(img, copy='all'):
+    """ Raw APPn and COM segments of parsed image, as (marker code, payload)
+    copy is 'all', 'comments' (COM segments only) or 'none', segments needed
+    to interpret colors are always kept
+    """
+    if copy not in ('all', 'comments', 'none'):
+        raise ValueError('unknown copy option {}'.format(copy))
+
+    segments = []
+    for code, marker, pos in img.marker_codes:
+        if marker not in (APP, COM):
+            continue
+        img.fp.seek(pos)
+        data, _ = read_block(img.fp)
+        payload = data.getvalue()
+        if copy == 'all' or is_format_segment(code, payload):
+            segments.append((code, payload))
+        elif copy == 'comments' and marker == COM:
+            segments.append((code, payload))
+    return segments
+
+def load_coefficients(fp):
+    img = JpegImage(fp)
+    img.parse()
+    img.decode_coefficients()
+    return img
+
+def optimize(fp, output, copy='all'):
+    """ Re-encode JPEG image from fp to output with optimal Huffman tables,
+    as a single baseline scan. Decoded pixels are exactly the same
+    """
+    img = load_coefficients(fp)
+    segments = read_segments(img, copy)
+    write_frame(output, img.frame, optimize=True, segments=segments)
+
+def get_quality_tables(quantization, quality):
+    """ Standard tables scaled by quality, table 0 is for luminance,
+    others are for chrominance
+    """
+    result = {}
+    for qc in quantization:
+        table = std_tables.luminance_quantization if qc == 0 else std_tables.chrominance_quantization
+        result[qc] = std_tables.scale_quantization(table, quality)
+    return result
+
+def requantize_frame(frame, tables):
+    """ Requantize entropy-decoded coefficients of frame in place with new
+    quantization tables (row-major), tables never get finer than the
+    original ones
+    """
+    quantization = {}
+    for qc, table in frame.quantization.items():
+        new_table = tables.get(qc, table)
+        if len(new_table) != 64:
+            raise ValueError('bad quantization table size')
+        quantization[qc] = tuple(max(q, min(new_q, 255))
+                                 for q, new_q in zip(table, new_table))
+
+    for comp in frame.components:
+        old = frame.quantization[comp.qc]
+        new = quantization[comp.qc]
+        changed = [c for c in range(64) if old[c] != new[c]]
+        for block in comp.blocks:
+            for c in changed:
+                value = block[c]
+                if value:
+                    block[c] = quantize(value * old[c], new[c])
+    frame.quantization = quantization
+
+def requantize(fp, output, quality=None, tables=None, copy='all'):
+    """ Reduce quality of JPEG image from fp by requantization of its
+    coefficients, either to the standard tables scaled by quality or to
+    given tables (dictionary table id -> row-major 8x8 table)
+    """
+    if (quality is None) == (tables is None):
+        raise ValueError('either quality or tables is required')
+    img = load_coefficients(fp)
+    segments = read_segments(img, copy)
+    frame = img.frame
+    if tables is None:
+        tables = get_quality_tables(frame.quantization, quality)
+    requantize_frame(frame, tables)
+    write_frame(output, frame, optimize=True, segments=segments)
+
+def to_baseline(fp, output, copy='all'):
+    """ Write coefficients of JPEG image as a single baseline scan """
+    optimize(fp, output, copy)
+
+def to_progressive(fp, output, copy='all'):
+    """ Write coefficients of JPEG image as progressive JPEG with the
+    standard scan script
+    """
+    img = load_coefficients(fp)
+    segments = read_segments(img, copy)
+    write_progressive_frame(output, img.frame, segments=segments)
+
+def transcode_files(paths, output_dir, progressive, copy='all'):
+    """ Transcode JPEG files to output directory, yields (path, error)
+    for each file, error is None on success
+    """
+    convert = to_progressive if progressive else to_baseline
+    for path in paths:
+        target = os.path.join(output_dir, os.path.basename(path))
+        output = BytesIO()
+        try:
+            with open(path, 'rb') as f:
+                convert(f, output, copy)
+            with open(target, 'wb') as f:
+                f.write(output.getbuffer())
+        except (EOFError, BadMarker, SyntaxError, ValueError, OSError) as e:
+            yield path, e
+        else:
+            yield path, None
+
+def iter_jpeg_files(paths):
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for name in sorted(os.listdir(path)):
+            if name.lower().endswith(('.jpg', '.jpeg')):
+                yield os.path.join(path, name)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m jpeg.transcode',
+        description='Lossless transcoding of JPEG files')
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--progressive', action='store_true')
+    mode.add_argument('--baseline', action='store_true')
+    parser.add_argument('--copy', choices=('all', 'comments', 'none'), default='all')
+    parser.add_argument('output_dir')
+    parser.add_argument('inputs', nargs='+', help='JPEG files or directories')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    failed = 0
+    paths = iter_jpeg_files(args.inputs)
+    for path, error in transcode_files(paths, args.output_dir, args.progressive, args.copy):
+        if error:
+            failed += 1
+            print('{}: {}'.format(path, error), file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
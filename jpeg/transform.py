@@ -0,0 +1,102 @@
+""" Lossless transformations of JPEG image, done on quantized DCT
+coefficients, without IDCT and pixels.
+
+Flipping is possible only for whole MCUs, so partial MCUs on the edge
+which would be moved by the transformation are trimmed away (the same as
+jpegtran -trim does).
+"""
+from .core import JpegImage, Frame
+from .encoder import write_frame, SOF0_CODE
+
+
+# (transpose, flip horizontally, flip vertically), transposition first
+operations = {
+    'flip_h': (False, True, False),
+    'flip_v': (False, False, True),
+    'transpose': (True, False, False),
+    'transverse': (True, True, True),
+    'rot90': (True, True, False),
+    'rot180': (False, True, True),
+    'rot270': (True, False, True),
+}
+
+def get_coefficient_map(op):
+    """ For each coefficient of transformed block (row-major) gives
+    position in the source block and sign
+    """
+    transpose, flip_x, flip_y = operations[op]
+    result = []
+    for v in range(8):
+        for u in range(8):
+            src = u * 8 + v if transpose else v * 8 + u
+            sign = 1
+            if flip_x and u % 2:
+                sign = -sign
+            if flip_y and v % 2:
+                sign = -sign
+            result.append((src, sign))
+    return result
+
+def transform_quantization(table, transpose):
+    if not transpose:
+        return table
+    return tuple(table[u * 8 + v] for v in range(8) for u in range(8))
+
+def trim(size, mcu_size, flip):
+    if not flip:
+        return size
+    trimmed = size - size % mcu_size
+    if not trimmed:
+        raise ValueError('image is smaller than MCU')
+    return trimmed
+
+def transform_frame(frame, op):
+    """ Make a new frame with transformed coefficients of frame, which
+    should be entropy-decoded
+    """
+    if op not in operations:
+        raise ValueError('unknown transformation {}'.format(op))
+    transpose, flip_x, flip_y = operations[op]
+    coefficient_map = get_coefficient_map(op)
+
+    w, h = (frame.h, frame.w) if transpose else (frame.w, frame.h)
+    max_h, max_v = (frame.max_v, frame.max_h) if transpose else (frame.max_h, frame.max_v)
+    w = trim(w, 8 * max_h, flip_x)
+    h = trim(h, 8 * max_v, flip_y)
+
+    result = Frame(SOF0_CODE, w, h)
+    result.restart_interval = frame.restart_interval
+    result.quantization = {qc: transform_quantization(table, transpose)
+                           for qc, table in frame.quantization.items()}
+    for comp in frame.components:
+        sh, sv = comp.sampling
+        if transpose:
+            sh, sv = sv, sh
+        result.add_component(comp.id, sh, sv, comp.qc)
+    result.prepare()
+
+    for src_comp, comp in zip(frame.components, result.components):
+        src_w, src_h = src_comp.blocks_size
+        width, height = comp.blocks_size
+        for row in range(height):
+            y = height - 1 - row if flip_y else row
+            for col in range(width):
+                x = width - 1 - col if flip_x else col
+                sx, sy = (y, x) if transpose else (x, y)
+                if sx >= src_w or sy >= src_h:
+                    continue
+                src = src_comp.blocks[sy * src_w + sx]
+                block = comp.blocks[row * width + col]
+                for c, (z, sign) in enumerate(coefficient_map):
+                    block[c] = sign * src[z]
+    return result
+
+def transform(fp, output, op, optimize=False):
+    """ Read JPEG image from fp, write it transformed to output.
+    op is one of flip_h, flip_v, transpose, transverse, rot90 (clockwise),
+    rot180 and rot270
+    """
+    img = JpegImage(fp)
+    img.parse()
+    img.decode_coefficients()
+    write_frame(output, transform_frame(img.frame, op), optimize=optimize)
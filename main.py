@@ -1,20 +1,49 @@
+import os
 import sys
+import argparse
+from contextlib import closing
 from tempfile import NamedTemporaryFile
 import subprocess
 from jpeg import JpegImage
+from jpeg.core import DECODE_ERRORS, get_error_message
+from jpeg.events import PrintObserver
+from jpeg.profiling import PROFILE_PATH
+from jpeg.stream import decode_file
+from jpeg.transcode import iter_jpeg_files
 from bmp.core import write_bmp
 
 
-def main(infile):
+def load_stdin():
+    """ stdin is not seekable, it's read once, returns None if decoding
+    failed
+    """
+    observer = PrintObserver()
+    try:
+        return decode_file(sys.stdin.buffer, observer=observer)
+    except DECODE_ERRORS as e:
+        observer('error', message=get_error_message(e))
+        return None
+
+def load(infile, profile=None):
+    if infile == '-':
+        return load_stdin()
     with open(infile, 'rb') as f:
-        img = JpegImage(f)
-        img.process()
-        if not img.is_valid:
-            return
+        img = JpegImage(f, observer=PrintObserver())
+        if profile:
+            img.process(profile=True, profile_path=profile)
+            print(img.profile_report)
+        else:
+            img.process()
+        return img
+
+def main(infile, profile=None):
+    img = load(infile, profile)
+    if img is None or not img.is_valid:
+        return
 
-        frame = img.frame
-        data = img.get_linearized_data()
-        fmt = img.get_format()
+    frame = img.frame
+    data = img.get_linearized_data()
+    fmt = img.get_format()
 
     # from PIL import Image
     # dimg = Image.frombytes(fmt, (frame.w, frame.h), data.tobytes())
@@ -25,9 +54,41 @@ def main(infile):
         f.flush()
         subprocess.run(['display', f.name])
 
+def convert_dir(input_dir, output_dir, workers=None):
+    """ Convert all JPEG files of directory to BMP, returns number of
+    failed files
+    """
+    # shared memory of batch decoding needs Python 3.8
+    from jpeg.batch import decode_many
+
+    os.makedirs(output_dir, exist_ok=True)
+    paths = list(iter_jpeg_files([input_dir]))
+    failed = 0
+    # images in flight are released if writing fails
+    with closing(decode_many(paths, workers=workers)) as results:
+        for result in results:
+            path = paths[result.index]
+            if result.error:
+                failed += 1
+                print('{}: {}'.format(path, result.error), file=sys.stderr)
+                continue
+            image = result.image
+            name = os.path.splitext(os.path.basename(path))[0] + '.bmp'
+            with open(os.path.join(output_dir, name), 'wb') as f:
+                write_bmp(f, image.format, image.w, image.h, image.data)
+    return failed
+
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print('1 argument, jpeg image path, is required')
-        sys.exit(1)
-    main(sys.argv[1])
+    parser = argparse.ArgumentParser(prog='python main.py')
+    parser.add_argument('input', help='JPEG image path, - for stdin, or directory with --batch')
+    parser.add_argument('--batch', metavar='OUTPUT_DIR',
+                        help='convert JPEG files of input directory to BMP')
+    parser.add_argument('--profile', metavar='PSTATS', nargs='?', const=PROFILE_PATH,
+                        help='profile decoding, write pstats file and print allocations')
+    args = parser.parse_args()
+    if args.profile and args.input == '-':
+        parser.error('--profile needs a file, stdin is not supported')
+    if args.batch:
+        sys.exit(1 if convert_dir(args.input, args.batch) else 0)
+    main(args.input, args.profile)